@@ -0,0 +1,142 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from api.constants import RECIPE_REPR_CACHE, TAG_CACHE
+from recipes.models import Tag
+
+
+def version_key(namespace):
+    return f'{namespace}:version'
+
+
+def get_cache_version(namespace):
+    """Возвращает текущую версию пространства имён кэша."""
+    key = version_key(namespace)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), None)
+        version = cache.get(key)
+    return version
+
+
+def bump_cache_version(namespace):
+    """
+    Увеличивает версию пространства имён кэша.
+
+    Ключи со старой версией больше не читаются и вытесняются по TTL.
+    """
+    key = version_key(namespace)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        cache.add(key, time.time_ns(), None)
+        return cache.get(key)
+
+
+def bump_cache_version_on_commit(namespace):
+    """
+    Увеличивает версию после фиксации транзакции.
+
+    Иначе параллельный запрос успел бы записать под новой версией
+    данные, прочитанные до фиксации.
+    """
+    transaction.on_commit(lambda: bump_cache_version(namespace))
+
+
+def user_namespace(namespace, user_id):
+    """Пространство имён кэша `namespace` для одного пользователя."""
+    return f'{namespace}:user:{user_id}'
+
+
+def record_cache_stats(namespace, hits=0, misses=0):
+    """Учитывает попадания и промахи кэша в общих счётчиках."""
+    for event, value in (('hits', hits), ('misses', misses)):
+        if not value:
+            continue
+        key = f'{namespace}:stats:{event}'
+        try:
+            cache.incr(key, value)
+        except ValueError:
+            if not cache.add(key, value, None):
+                cache.incr(key, value)
+
+
+def get_cache_stats(namespace):
+    """Возвращает счётчики попаданий и промахов кэша."""
+    events = ('hits', 'misses')
+    values = cache.get_many(
+        [f'{namespace}:stats:{event}' for event in events]
+    )
+    return {
+        event: values.get(f'{namespace}:stats:{event}', 0)
+        for event in events
+    }
+
+
+def recipe_cache_keys(recipe_ids):
+    version = get_cache_version(RECIPE_REPR_CACHE)
+    return {
+        f'{RECIPE_REPR_CACHE}:{version}:{recipe_id}': recipe_id
+        for recipe_id in recipe_ids
+    }
+
+
+def get_recipe_representations(recipe_ids, origin):
+    """
+    Возвращает закэшированные представления рецептов по их `id`.
+
+    Представления строятся с абсолютными ссылками на изображения,
+    поэтому запись для другого `origin` (схемы и хоста) считается
+    промахом.
+    """
+    keys = recipe_cache_keys(recipe_ids)
+    representations = {
+        keys[key]: value['data']
+        for key, value in cache.get_many(keys).items()
+        if value.get('origin') == origin
+    }
+    record_cache_stats(
+        RECIPE_REPR_CACHE,
+        hits=len(representations),
+        misses=len(keys) - len(representations),
+    )
+    return representations
+
+
+def set_recipe_representations(representations, origin):
+    """Сохраняет представления рецептов, заданные словарём по `id`."""
+    keys = recipe_cache_keys(representations)
+    cache.set_many(
+        {
+            key: {'origin': origin, 'data': representations[recipe_id]}
+            for key, recipe_id in keys.items()
+        },
+        settings.RECIPE_CACHE_TIMEOUT,
+    )
+
+
+def invalidate_recipe_representations(recipe_ids):
+    """Удаляет представления рецептов после фиксации транзакции."""
+    recipe_ids = list(recipe_ids)
+    if recipe_ids:
+        transaction.on_commit(
+            lambda: cache.delete_many(recipe_cache_keys(recipe_ids))
+        )
+
+
+def get_tag_ids(slugs):
+    """
+    Возвращает `id` тегов по слагам `slugs`, неизвестные слаги пропускает.
+
+    Словарь слагов хранится в кэше под версией `TAG_CACHE`, которую
+    сигналы меняют при изменении тегов.
+    """
+    key = f'{TAG_CACHE}:{get_cache_version(TAG_CACHE)}:slugs'
+    tag_ids = cache.get(key)
+    if tag_ids is None:
+        tag_ids = dict(Tag.objects.values_list('slug', 'id'))
+        cache.set(key, tag_ids, settings.TAG_CACHE_TIMEOUT)
+    return [tag_ids[slug] for slug in slugs if slug in tag_ids]
@@ -0,0 +1,66 @@
+import hashlib
+
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
+
+from api.cache import get_cache_version
+
+
+def make_etag(*parts):
+    """Сильный валидатор `ETag` из частей версии ответа."""
+    return quote_etag(
+        hashlib.sha1(
+            ':'.join(str(part) for part in parts).encode()
+        ).hexdigest()
+    )
+
+
+def conditional_response(request, etag, get_response):
+    """
+    Отвечает 304 на совпавший `If-None-Match` без вызова `get_response`.
+
+    Иначе строит ответ и добавляет к нему `ETag`.
+    """
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = get_response()
+        if response.status_code != 200:
+            return response
+    response['ETag'] = etag
+    return response
+
+
+class VersionedViewSetMixin:
+    """
+    Условные ответы для справочника.
+
+    `ETag` строится из версии пространства имён кэша `version_namespace`,
+    которую сигналы меняют при каждом изменении таблицы, и адреса запроса.
+    """
+
+    version_namespace = None
+
+    def get_etag(self, request):
+        return make_etag(
+            self.version_namespace,
+            get_cache_version(self.version_namespace),
+            request.get_full_path(),
+        )
+
+    def list(self, request, *args, **kwargs):
+        return conditional_response(
+            request,
+            self.get_etag(request),
+            lambda: super(VersionedViewSetMixin, self).list(
+                request, *args, **kwargs
+            ),
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return conditional_response(
+            request,
+            self.get_etag(request),
+            lambda: super(VersionedViewSetMixin, self).retrieve(
+                request, *args, **kwargs
+            ),
+        )
@@ -1,4 +1,7 @@
 from reportlab.lib import colors
+from reportlab.lib.units import inch
+
+from shortener.constants import SHORT_LINK_CACHE
 
 PAGE_SIZE = 6
 COOKING_TIME_MAX = 32_000
@@ -30,3 +33,41 @@ GRID_COLOR = colors.white
 GRID = 0
 DATA_COLUMN1 = 'Ингредиенты'
 DATA_COLUMN2 = 'Количество'
+COLUMN_WIDTHS = (4 * inch, 2.5 * inch)
+TABLE_CHUNK_ROWS = 20
+RECIPE_COUNT_CACHE = 'recipes:count'
+RECIPE_REPR_CACHE = 'recipes:repr'
+SHOPPING_LIST_CACHE = 'shopping_list'
+CACHE_STATS_NAMESPACES = (
+    RECIPE_REPR_CACHE,
+    SHOPPING_LIST_CACHE,
+    SHORT_LINK_CACHE,
+)
+INGREDIENT_INDEX_CACHE = 'ingredients:index'
+TAG_CACHE = 'tags'
+TRIGRAM_SIMILARITY_THRESHOLD = 0.3
+TRIGRAM_SEARCH_LIMIT = 10
+LATIN_HOMOGLYPHS = 'aceopxykmthb'
+CYRILLIC_HOMOGLYPHS = 'асеорхукмтнв'
+RECIPE_IMAGE_SIZES = (
+    ('card', 480),
+    ('detail', 1280),
+)
+AVATAR_IMAGE_SIZES = (
+    ('avatar', 256),
+)
+IMAGE_VARIANTS_DIR = 'variants'
+IMAGE_SIGNATURES = (
+    b'\x89PNG\r\n\x1a\n',
+    b'\xff\xd8\xff',
+    b'GIF87a',
+    b'GIF89a',
+)
+MULTIPART_JSON_FIELDS = ('ingredients', 'tags')
+BASE64_HEADER = ';base64,'
+RECIPE_BATCH_MAX = 100
+BATCH_ADDED = 'added'
+BATCH_REMOVED = 'removed'
+BATCH_ALREADY_ADDED = 'already_added'
+BATCH_NOT_ADDED = 'not_added'
+BATCH_NOT_FOUND = 'not_found'
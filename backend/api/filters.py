@@ -1,11 +1,14 @@
 from django.contrib.auth import get_user_model
+from django.db.models import Exists, OuterRef
 from django_filters.rest_framework import (
     BooleanFilter,
     CharFilter,
+    Filter,
     FilterSet,
-    AllValuesMultipleFilter,
 )
+from django_filters.widgets import QueryArrayWidget
 
+from api.cache import get_tag_ids
 from recipes.models import (
     Ingredient,
     Recipe,
@@ -27,9 +30,10 @@ class IngredientFilter(FilterSet):
 class RecipeFilter(FilterSet):
     """Фильтр для рецептов."""
 
-    tags = AllValuesMultipleFilter(field_name='tags__slug')
+    tags = Filter(method='filter_tags', widget=QueryArrayWidget)
     is_favorited = BooleanFilter(method='filter_is_favorited')
     is_in_shopping_cart = BooleanFilter(method='filter_is_in_shopping_cart')
+    search = CharFilter(method='filter_search')
 
     class Meta:
         model = Recipe
@@ -38,27 +42,56 @@ class RecipeFilter(FilterSet):
             'tags',
             'is_favorited',
             'is_in_shopping_cart',
+            'search',
         )
 
-    def filter_by_relation(self, queryset, relation_name, value):
+    def filter_tags(self, queryset, name, value):
+        """
+        Рецепты хотя бы с одним из тегов по слагам `value`.
+
+        Слаги переводятся в `id` по кэшу, отбор идёт подзапросом EXISTS
+        по связям рецептов и тегов, поэтому строки рецептов не
+        дублируются и `DISTINCT` не нужен.
+        """
+        tag_ids = get_tag_ids(value)
+        if not tag_ids:
+            return queryset.none()
+        return queryset.filter(
+            Exists(
+                Recipe.tags.through.objects.filter(
+                    recipe=OuterRef('pk'),
+                    tag_id__in=tag_ids,
+                )
+            )
+        )
+
+    def filter_by_relation(self, queryset, flag, value):
         """
         Универсальный метод фильтрации по отношению.
+
+        Фильтрует по флагу, аннотированному
+        `Recipe.objects.with_user_flags`: отбор остаётся подзапросом
+        EXISTS в запросе страницы и не передаёт в базу списки `id`
+        из `ViewerRelations`.
         """
         user = self.request.user
         if user.is_authenticated and value:
-            return queryset.filter(**{f"{relation_name}__author": user})
+            return queryset.filter(**{flag: True})
         return queryset
 
     def filter_is_favorited(self, queryset, name, value):
         return self.filter_by_relation(
             queryset,
-            "favorites",
+            "is_favorited",
             value
         )
 
     def filter_is_in_shopping_cart(self, queryset, name, value):
         return self.filter_by_relation(
             queryset,
-            "shopping_cart",
+            "is_in_shopping_cart",
             value
         )
+
+    def filter_search(self, queryset, name, value):
+        return queryset.search(value)
@@ -0,0 +1,188 @@
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import models, transaction
+from PIL import Image, ImageOps, features
+
+from api.cache import invalidate_recipe_representations
+from api.constants import (
+    AVATAR_IMAGE_SIZES,
+    IMAGE_VARIANTS_DIR,
+    RECIPE_IMAGE_SIZES,
+)
+from api.tasks import WorkerPool
+from recipes.models import Recipe
+
+User = get_user_model()
+
+image_pool = WorkerPool('image-variants', 'IMAGE_VARIANT_WORKERS')
+
+
+def variant_format():
+    """Формат вариантов: WebP, если Pillow его поддерживает, иначе JPEG."""
+    if settings.IMAGE_VARIANT_FORMAT == 'WEBP' and features.check('webp'):
+        return 'WEBP', 'webp'
+    return 'JPEG', 'jpg'
+
+
+class ImageVariants:
+    """
+    Уменьшенные копии изображения из поля `field` модели.
+
+    Пути вариантов хранятся в JSON-поле `variants_field` вместе
+    с именем исходного файла в ключе `source`. Варианты считаются
+    готовыми, только если `source` совпадает с текущим файлом, иначе
+    вместо них отдаётся оригинал.
+    """
+
+    def __init__(self, model, field, variants_field, sizes, invalidate):
+        self.model = model
+        self.field = field
+        self.variants_field = variants_field
+        self.sizes = sizes
+        self.invalidate = invalidate
+
+    def is_ready(self, instance):
+        image = getattr(instance, self.field)
+        variants = getattr(instance, self.variants_field) or {}
+        return bool(image) and variants.get('source') == image.name
+
+    def urls(self, instance):
+        """Адреса вариантов или оригинала, если вариантов ещё нет."""
+        image = getattr(instance, self.field)
+        if not image:
+            return None
+        if not self.is_ready(instance):
+            return {name: image.url for name, _ in self.sizes}
+        variants = getattr(instance, self.variants_field)
+        return {
+            name: default_storage.url(variants[name])
+            for name, _ in self.sizes
+        }
+
+    def schedule(self, instance):
+        """
+        Ставит построение вариантов в очередь после фиксации.
+
+        Если изображение удалено, сбрасывает варианты.
+        """
+        image = getattr(instance, self.field)
+        if not image:
+            self.clear(instance)
+            return
+        if self.is_ready(instance):
+            return
+        pk, source = instance.pk, image.name
+        transaction.on_commit(
+            lambda: image_pool.submit(self.generate, pk, source)
+        )
+
+    def generate(self, pk, source):
+        """
+        Строит варианты файла `source` объекта `pk`.
+
+        Изображение декодируется один раз для всех размеров. Варианты
+        сохраняются, только если у объекта всё ещё тот же файл, старые
+        варианты удаляются.
+        """
+        previous = self.model.objects.filter(pk=pk).values_list(
+            self.variants_field,
+            flat=True
+        ).first()
+        variants = {'source': source, **self.render(source)}
+        updated = self.model.objects.filter(
+            pk=pk,
+            **{self.field: source}
+        ).update(**{self.variants_field: variants})
+        if not updated:
+            self.delete_files(variants)
+            return
+        if previous:
+            self.delete_files(previous)
+        self.invalidate(pk)
+
+    def render(self, source):
+        image_format, extension = variant_format()
+        directory, filename = os.path.split(source)
+        stem = os.path.splitext(filename)[0]
+        largest = max(size for _, size in self.sizes)
+        with default_storage.open(source, 'rb') as file:
+            image = Image.open(file)
+            image.draft('RGB', (largest, largest))
+            image = ImageOps.exif_transpose(image)
+            image.load()
+        if image_format == 'JPEG' or image.mode not in ('RGB', 'RGBA'):
+            image = image.convert(
+                'RGBA' if image_format == 'WEBP'
+                and 'A' in image.getbands() else 'RGB'
+            )
+        paths = {}
+        for name, size in self.sizes:
+            variant = image.copy()
+            variant.thumbnail((size, size), Image.LANCZOS)
+            buffer = BytesIO()
+            variant.save(
+                buffer,
+                image_format,
+                quality=settings.IMAGE_VARIANT_QUALITY,
+            )
+            paths[name] = default_storage.save(
+                os.path.join(
+                    directory,
+                    IMAGE_VARIANTS_DIR,
+                    f'{stem}_{name}.{extension}',
+                ),
+                ContentFile(buffer.getvalue()),
+            )
+        return paths
+
+    def clear(self, instance):
+        """Сбрасывает варианты объекта без изображения и удаляет файлы."""
+        variants = getattr(instance, self.variants_field) or {}
+        if not variants:
+            return
+        setattr(instance, self.variants_field, {})
+        self.model.objects.filter(
+            models.Q(**{self.field: ''})
+            | models.Q(**{f'{self.field}__isnull': True}),
+            pk=instance.pk,
+        ).update(**{self.variants_field: {}})
+        transaction.on_commit(lambda: self.delete_files(variants))
+
+    def delete(self, instance):
+        """Удаляет файлы вариантов после фиксации удаления объекта."""
+        variants = getattr(instance, self.variants_field) or {}
+        if variants:
+            transaction.on_commit(lambda: self.delete_files(variants))
+
+    @staticmethod
+    def delete_files(variants):
+        for name, path in variants.items():
+            if name != 'source':
+                default_storage.delete(path)
+
+
+def invalidate_author_recipes(author_id):
+    invalidate_recipe_representations(
+        Recipe.objects.filter(author_id=author_id).values_list('id', flat=True)
+    )
+
+
+recipe_image_variants = ImageVariants(
+    Recipe,
+    'image',
+    'image_variants',
+    RECIPE_IMAGE_SIZES,
+    lambda pk: invalidate_recipe_representations([pk]),
+)
+avatar_variants = ImageVariants(
+    User,
+    'avatar',
+    'avatar_variants',
+    AVATAR_IMAGE_SIZES,
+    invalidate_author_recipes,
+)
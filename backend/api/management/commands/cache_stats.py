@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from api.cache import get_cache_stats
+from api.constants import CACHE_STATS_NAMESPACES
+
+
+class Command(BaseCommand):
+    help = 'Выводит счётчики попаданий и промахов кэшей.'
+
+    def handle(self, *args, **options):
+        for namespace in CACHE_STATS_NAMESPACES:
+            stats = get_cache_stats(namespace)
+            total = stats['hits'] + stats['misses']
+            ratio = stats['hits'] / total if total else 0
+            self.stdout.write(
+                f'{namespace}: hits={stats["hits"]} '
+                f'misses={stats["misses"]} hit_ratio={ratio:.2%}'
+            )
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from api.images import avatar_variants, recipe_image_variants
+
+
+class Command(BaseCommand):
+    help = 'Строит уменьшенные варианты картинок рецептов и аватаров.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Перестроить варианты, даже если они уже готовы.',
+        )
+
+    def handle(self, *args, **options):
+        for variants in (recipe_image_variants, avatar_variants):
+            built = 0
+            objects = variants.model.objects.exclude(
+                **{variants.field: ''}
+            ).exclude(**{f'{variants.field}__isnull': True})
+            for instance in objects.iterator():
+                if options['force'] or not variants.is_ready(instance):
+                    variants.generate(
+                        instance.pk,
+                        getattr(instance, variants.field).name
+                    )
+                    built += 1
+            self.stdout.write(
+                f'{variants.model._meta.verbose_name_plural}: '
+                f'построено вариантов для {built} объектов.'
+            )
@@ -0,0 +1,66 @@
+import random
+import statistics
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api.constants import (
+    CYRILLIC_HOMOGLYPHS,
+    LATIN_HOMOGLYPHS,
+    TRIGRAM_SEARCH_LIMIT,
+)
+from api.search import trigram_search
+from recipes.models import Ingredient
+
+
+def misspell(name, rng):
+    """Портит название: пропускает букву или подменяет её латинской."""
+    letters = [
+        index for index, letter in enumerate(name) if letter.isalpha()
+    ]
+    if len(letters) < 4:
+        return name
+    index = rng.choice(letters)
+    if name[index] in CYRILLIC_HOMOGLYPHS and rng.random() < 0.5:
+        latin = LATIN_HOMOGLYPHS[CYRILLIC_HOMOGLYPHS.index(name[index])]
+        return name[:index] + latin + name[index + 1:]
+    return name[:index] + name[index + 1:]
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет задержку и полноту нечёткого поиска ингредиентов '
+        'на запросах с опечатками по всему каталогу.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--queries', type=int, default=500)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        catalog = list(Ingredient.objects.values_list('id', 'name'))
+        if not catalog:
+            self.stderr.write('Каталог ингредиентов пуст.')
+            return
+        trigram_search('', TRIGRAM_SEARCH_LIMIT)
+        timings, found = [], 0
+        for pk, name in rng.choices(catalog, k=options['queries']):
+            query = misspell(name, rng)
+            started = time.perf_counter()
+            results = trigram_search(query, TRIGRAM_SEARCH_LIMIT)
+            timings.append((time.perf_counter() - started) * 1000)
+            found += any(item['id'] == pk for item in results)
+        timings.sort()
+        p95 = timings[int(len(timings) * 0.95) - 1]
+        target = settings.INGREDIENT_SEARCH_TARGET_MS
+        self.stdout.write(
+            f'catalog={len(catalog)} queries={len(timings)} '
+            f'p50={statistics.median(timings):.2f}ms p95={p95:.2f}ms '
+            f'max={timings[-1]:.2f}ms recall={found / len(timings):.1%}'
+        )
+        if p95 > target:
+            self.stderr.write(f'p95 выше цели {target}ms')
+        else:
+            self.stdout.write(self.style.SUCCESS(f'p95 в пределах {target}ms'))
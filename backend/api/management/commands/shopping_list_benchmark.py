@@ -0,0 +1,38 @@
+import time
+from tempfile import TemporaryFile
+
+from django.core.management.base import BaseCommand
+
+from api.utils import ShoppingListItem, shopping_list_renderer
+
+
+class Command(BaseCommand):
+    help = 'Замеряет время генерации PDF со списком покупок.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes',
+            type=int,
+            nargs='+',
+            default=[10, 500, 5000],
+        )
+        parser.add_argument('--repeat', type=int, default=3)
+
+    def handle(self, *args, **options):
+        shopping_list_renderer.register_fonts()
+        for size in options['sizes']:
+            shopping_list = [
+                ShoppingListItem(f'Ингредиент {index}', index, 'г')
+                for index in range(size)
+            ]
+            timings = []
+            for _ in range(options['repeat']):
+                with TemporaryFile() as output:
+                    started = time.perf_counter()
+                    shopping_list_renderer.render(shopping_list, output)
+                    timings.append(time.perf_counter() - started)
+                    pdf_size = output.tell()
+            self.stdout.write(
+                f'items={size} best={min(timings) * 1000:.1f}ms '
+                f'worst={max(timings) * 1000:.1f}ms size={pdf_size} bytes'
+            )
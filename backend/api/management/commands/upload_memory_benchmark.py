@@ -0,0 +1,112 @@
+import base64
+import json
+import os
+import tempfile
+import tracemalloc
+from io import BytesIO
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test.utils import override_settings
+from PIL import Image
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from api.views import RecipeViewSet
+from recipes.models import Ingredient, Tag
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает пиковую память Python при создании рецепта '
+        'с картинкой в base64 JSON и в multipart/form-data.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--size',
+            type=int,
+            default=7,
+            help='Примерный размер картинки в МБ.',
+        )
+
+    @staticmethod
+    def make_image(size):
+        """JPEG из шума размером около `size` МБ."""
+        side = int((size * 1024 * 1024 / 1.1) ** 0.5)
+        image = Image.frombytes(
+            'RGB',
+            (side, side),
+            os.urandom(side * side * 3)
+        )
+        buffer = BytesIO()
+        image.save(buffer, 'JPEG', quality=95)
+        return buffer.getvalue()
+
+    def handle(self, *args, **options):
+        content = self.make_image(options['size'])
+        image = BytesIO(content)
+        image.name = 'upload-benchmark.jpg'
+        factory = APIRequestFactory()
+        view = RecipeViewSet.as_view({'post': 'create'})
+        settings = override_settings(IMAGE_UPLOAD_MAX_SIZE=len(content) * 2)
+        with tempfile.TemporaryDirectory() as media_root, settings, \
+                override_settings(MEDIA_ROOT=media_root), \
+                transaction.atomic():
+            user = User.objects.create_user(
+                email='upload-benchmark@example.com',
+                username='upload-benchmark',
+                first_name='upload',
+                last_name='benchmark',
+                password='upload-benchmark',
+            )
+            tag = Tag.objects.create(name='upload-benchmark', slug='ub')
+            ingredient = Ingredient.objects.create(
+                name='upload-benchmark',
+                measurement_unit='г'
+            )
+            fields = {
+                'name': 'upload-benchmark',
+                'text': 'upload-benchmark',
+                'cooking_time': 1,
+                'tags': [tag.id],
+                'ingredients': [{'id': ingredient.id, 'amount': 1}],
+            }
+            requests = {
+                'base64': factory.post(
+                    '/api/recipes/',
+                    json.dumps({
+                        **fields,
+                        'image': 'data:image/jpeg;base64,'
+                        + base64.b64encode(content).decode(),
+                    }),
+                    content_type='application/json',
+                ),
+                'multipart': factory.post(
+                    '/api/recipes/',
+                    {
+                        **fields,
+                        'tags': json.dumps(fields['tags']),
+                        'ingredients': json.dumps(fields['ingredients']),
+                        'image': image,
+                    },
+                    format='multipart',
+                ),
+            }
+            self.stdout.write(f'Картинка: {len(content) / 1024 / 1024:.1f} МБ')
+            for name, request in requests.items():
+                force_authenticate(request, user)
+                tracemalloc.start()
+                response = view(request)
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+                request.close()
+                self.stdout.write(
+                    f'{name}: статус {response.status_code}, '
+                    f'пик {peak / 1024 / 1024:.1f} МБ'
+                )
+                if response.status_code >= 400:
+                    self.stdout.write(str(response.data))
+            transaction.set_rollback(True)
@@ -1,10 +1,165 @@
-from rest_framework.pagination import PageNumberPagination
+import hashlib
+from functools import partial
+from urllib.parse import urlencode
 
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db import connection
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+from .cache import get_cache_version, user_namespace
 from .constants import PAGE_SIZE
 
 
+class CountedPaginator(Paginator):
+    """Пагинатор с заранее посчитанным количеством объектов."""
+
+    def __init__(self, object_list, per_page, count=None, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        if count is not None:
+            self.count = count
+
+
+class FoodgramCursorPagination(CursorPagination):
+    """
+    Курсорная пагинация.
+
+    Порядок берётся из атрибута `cursor_ordering` вьюсета, по умолчанию
+    по дате создания и `id`, как у рецептов.
+    """
+
+    page_size = PAGE_SIZE
+    page_size_query_param = 'limit'
+    ordering = ('-created_at', '-id')
+
+    def get_ordering(self, request, queryset, view):
+        return getattr(view, 'cursor_ordering', self.ordering)
+
+
 class FoodgramPagination(PageNumberPagination):
-    """Пагинация."""
+    """
+    Пагинация.
+
+    Постраничная по `page` и `limit`; при наличии параметра `cursor`
+    переключается на курсорную пагинацию без `COUNT(*)` и `OFFSET`,
+    если порядок не задан параметром из `cursor_excluded_params`.
+
+    Если у вьюсета задан `count_cache_namespace`, общее количество
+    кэшируется по нормализованным параметрам фильтрации, а для списка
+    без фильтров может браться из оценки планировщика PostgreSQL.
+    Параметры из `count_cache_user_params` делают ключ зависимым от
+    пользователя и его версии `user_namespace`, которую меняют его
+    собственные записи.
+    """
 
     page_size = PAGE_SIZE
     page_size_query_param = 'limit'
+    cursor_query_param = 'cursor'
+    cursor_pagination_class = FoodgramCursorPagination
+    cursor_paginator = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_paginator = None
+        if self.use_cursor(request, view):
+            self.cursor_paginator = self.cursor_pagination_class()
+            return self.cursor_paginator.paginate_queryset(
+                queryset,
+                request,
+                view
+            )
+        self.django_paginator_class = partial(
+            CountedPaginator,
+            count=self.get_count(queryset, request, view),
+        )
+        return super().paginate_queryset(queryset, request, view)
+
+    def use_cursor(self, request, view):
+        """
+        Нужна ли курсорная пагинация.
+
+        Курсор задаёт свой порядок, поэтому при непустом параметре из
+        `cursor_excluded_params` вьюсета (например, поиск с ранжированием)
+        `cursor` игнорируется и используется постраничная пагинация.
+        """
+        if self.cursor_query_param not in request.query_params:
+            return False
+        return not any(
+            request.query_params.get(param)
+            for param in getattr(view, 'cursor_excluded_params', ())
+        )
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+    def get_filter_params(self, request):
+        """Параметры запроса без параметров пагинации."""
+        excluded = (
+            self.page_query_param,
+            self.page_size_query_param,
+            self.cursor_query_param,
+        )
+        return sorted(
+            (key, sorted(values))
+            for key, values in request.query_params.lists()
+            if key not in excluded
+        )
+
+    def get_count(self, queryset, request, view):
+        """
+        Количество объектов из кэша или оценки планировщика.
+
+        Возвращает `None`, если вьюсет не включил кэширование, тогда
+        количество считает пагинатор.
+        """
+        namespace = getattr(view, 'count_cache_namespace', None)
+        if namespace is None:
+            return None
+        params = self.get_filter_params(request)
+        if not params:
+            estimate = self.get_estimated_count(queryset)
+            if estimate is not None:
+                return estimate
+        version = get_cache_version(namespace)
+        user_params = getattr(view, 'count_cache_user_params', ())
+        if any(key in user_params for key, _ in params):
+            params.append(('user', [str(request.user.id)]))
+            version = '{}-{}'.format(
+                version,
+                get_cache_version(
+                    user_namespace(namespace, request.user.id)
+                ),
+            )
+        digest = hashlib.md5(
+            urlencode(params, doseq=True).encode()
+        ).hexdigest()
+        key = f'{namespace}:{version}:{digest}'
+        count = cache.get(key)
+        if count is None:
+            count = queryset.count()
+            cache.set(key, count, settings.PAGINATION_COUNT_CACHE_TIMEOUT)
+        return count
+
+    def get_estimated_count(self, queryset):
+        """
+        Оценка количества строк таблицы по `pg_class.reltuples`.
+
+        Используется только на PostgreSQL, если включена настройкой и
+        таблица не меньше `PAGINATION_COUNT_ESTIMATE_MIN` строк.
+        """
+        if (
+            not settings.PAGINATION_COUNT_ESTIMATE
+            or connection.vendor != 'postgresql'
+        ):
+            return None
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT reltuples FROM pg_class WHERE oid = %s::regclass',
+                [queryset.model._meta.db_table],
+            )
+            row = cursor.fetchone()
+        if row is None or row[0] < settings.PAGINATION_COUNT_ESTIMATE_MIN:
+            return None
+        return int(row[0])
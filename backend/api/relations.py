@@ -0,0 +1,83 @@
+from recipes.models import FavoriteRecipe, ShoppingCart
+from users.models import Subscriber
+
+FAVORITES = 'favorites'
+SHOPPING_CART = 'shopping_cart'
+SUBSCRIPTIONS = 'subscriptions'
+
+
+class ViewerRelations:
+    """
+    Связи текущего пользователя в рамках одного запроса.
+
+    Множества `id` избранных рецептов, рецептов в корзине и авторов в
+    подписках загружаются одним запросом каждое при первом обращении.
+    Изменения, сделанные в ходе запроса, вносятся через `add` и
+    `remove`. Пользователь берётся из запроса в момент загрузки, уже
+    после аутентификации DRF.
+    """
+
+    def __init__(self, request):
+        self.request = request
+        self.loaded = {}
+
+    def get_queryset(self, relation):
+        user = self.request.user
+        if relation == FAVORITES:
+            return FavoriteRecipe.objects.filter(
+                author=user
+            ).values_list('recipe_id', flat=True)
+        if relation == SHOPPING_CART:
+            return ShoppingCart.objects.filter(
+                author=user
+            ).values_list('recipe_id', flat=True)
+        if relation == SUBSCRIPTIONS:
+            return Subscriber.objects.filter(
+                user=user
+            ).values_list('author_id', flat=True)
+        raise ValueError(f'Неизвестная связь: {relation}')
+
+    def ids(self, relation):
+        """Множество `id` объектов связи `relation`."""
+        if relation not in self.loaded:
+            self.loaded[relation] = (
+                set(self.get_queryset(relation).order_by())
+                if self.request.user.is_authenticated else set()
+            )
+        return self.loaded[relation]
+
+    def contains(self, relation, obj_id):
+        return obj_id in self.ids(relation)
+
+    def add(self, relation, obj_id):
+        if relation in self.loaded:
+            self.loaded[relation].add(obj_id)
+
+    def remove(self, relation, obj_id):
+        if relation in self.loaded:
+            self.loaded[relation].discard(obj_id)
+
+
+def get_viewer_relations(request):
+    """
+    Связи текущего пользователя для запроса.
+
+    Обычно объект создаётся `ViewerRelationsMiddleware`; без него
+    создаётся при первом обращении.
+    """
+    relations = getattr(request, 'viewer_relations', None)
+    if relations is None:
+        relations = ViewerRelations(request)
+        request.viewer_relations = relations
+    return relations
+
+
+class ViewerRelationsMiddleware:
+    """Добавляет к запросу `viewer_relations`."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.viewer_relations = ViewerRelations(request)
+        return self.get_response(request)
@@ -0,0 +1,208 @@
+import heapq
+import re
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+
+from django.conf import settings
+from django.db import connection
+
+from api.cache import get_cache_version
+from api.constants import (
+    CYRILLIC_HOMOGLYPHS,
+    INGREDIENT_INDEX_CACHE,
+    LATIN_HOMOGLYPHS,
+    TRIGRAM_SIMILARITY_THRESHOLD,
+)
+from recipes.models import Ingredient
+
+HOMOGLYPHS = str.maketrans(LATIN_HOMOGLYPHS, CYRILLIC_HOMOGLYPHS)
+WORD_RE = re.compile(r'\w+')
+CYRILLIC_RE = re.compile('[а-я]')
+
+
+def normalize(text):
+    """
+    Приводит строку к виду для нечёткого сравнения.
+
+    Переводит в нижний регистр, заменяет `ё` на `е`, а в строках с
+    кириллицей — похожие латинские буквы на кириллические.
+    """
+    text = text.casefold().replace('ё', 'е')
+    if CYRILLIC_RE.search(text):
+        text = text.translate(HOMOGLYPHS)
+    return text
+
+
+def trigrams(text):
+    """Триграммы строки по правилам `pg_trgm`."""
+    result = set()
+    for word in WORD_RE.findall(text):
+        padded = f'  {word} '
+        result.update(
+            padded[index:index + 3] for index in range(len(padded) - 2)
+        )
+    return result
+
+
+class IngredientIndex:
+    """
+    Базовый индекс ингредиентов в памяти процесса.
+
+    Строится при первом запросе и перестраивается, когда меняется
+    версия `INGREDIENT_INDEX_CACHE` или истекает
+    `INGREDIENT_INDEX_MAX_AGE`. Наследники задают структуру в `build`.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.version = None
+        self.built_at = 0
+        self.entries = self.build([])
+
+    def build(self, rows):
+        """Строит структуру индекса по строкам `(name, id, unit)`."""
+        raise NotImplementedError
+
+    def is_fresh(self, version):
+        return (
+            self.version == version
+            and time.monotonic() - self.built_at
+            < settings.INGREDIENT_INDEX_MAX_AGE
+        )
+
+    def refresh(self):
+        """Перестраивает индекс, если он устарел."""
+        version = get_cache_version(INGREDIENT_INDEX_CACHE)
+        if self.is_fresh(version):
+            return
+        with self.lock:
+            if self.is_fresh(version):
+                return
+            self.entries = self.build(
+                Ingredient.objects.values_list(
+                    'name',
+                    'id',
+                    'measurement_unit',
+                )
+            )
+            self.version = version
+            self.built_at = time.monotonic()
+
+    @staticmethod
+    def to_item(name, pk, measurement_unit):
+        return {
+            'id': pk,
+            'name': name,
+            'measurement_unit': measurement_unit,
+        }
+
+
+class IngredientPrefixIndex(IngredientIndex):
+    """
+    Индекс ингредиентов для поиска по началу названия.
+
+    Хранит отсортированные названия в нижнем регистре и ищет по ним
+    бинарным поиском без обращения к базе.
+    """
+
+    def build(self, rows):
+        rows = sorted(
+            (name.casefold(), pk, name, measurement_unit)
+            for name, pk, measurement_unit in rows
+        )
+        return [row[0] for row in rows], [
+            self.to_item(name, pk, measurement_unit)
+            for _, pk, name, measurement_unit in rows
+        ]
+
+    def search(self, prefix, limit=None):
+        """Ингредиенты, название которых начинается с `prefix`."""
+        self.refresh()
+        keys, items = self.entries
+        prefix = prefix.casefold()
+        results = []
+        index = bisect_left(keys, prefix)
+        while (
+            index < len(keys)
+            and keys[index].startswith(prefix)
+            and (limit is None or len(results) < limit)
+        ):
+            results.append(items[index])
+            index += 1
+        return results
+
+
+class IngredientTrigramIndex(IngredientIndex):
+    """
+    Индекс ингредиентов для нечёткого поиска по триграммам.
+
+    Сходство считается как в `pg_trgm`: доля общих триграмм запроса и
+    названия от их объединения.
+    """
+
+    def build(self, rows):
+        grams, items, postings = [], [], {}
+        for index, (name, pk, measurement_unit) in enumerate(rows):
+            name_grams = trigrams(normalize(name))
+            grams.append(len(name_grams))
+            items.append(self.to_item(name, pk, measurement_unit))
+            for gram in name_grams:
+                postings.setdefault(gram, []).append(index)
+        return grams, items, postings
+
+    def search(self, query, limit):
+        """Ингредиенты, наиболее похожие на `query`, по убыванию сходства."""
+        self.refresh()
+        grams, items, postings = self.entries
+        query_grams = trigrams(normalize(query))
+        shared = Counter()
+        for gram in query_grams:
+            shared.update(postings.get(gram, ()))
+        ranked = []
+        for index, count in shared.items():
+            similarity = count / (len(query_grams) + grams[index] - count)
+            if similarity >= TRIGRAM_SIMILARITY_THRESHOLD:
+                ranked.append((-similarity, items[index]['name'], index))
+        return [
+            items[index]
+            for _, _, index in heapq.nsmallest(limit, ranked)
+        ]
+
+
+def postgres_trigram_search(query, limit):
+    """Нечёткий поиск ингредиентов средствами `pg_trgm`."""
+    from django.contrib.postgres.search import TrigramSimilarity
+
+    query = normalize(query)
+    return list(
+        Ingredient.objects.filter(
+            name__trigram_similar=query
+        ).annotate(
+            similarity=TrigramSimilarity('name', query)
+        ).order_by(
+            '-similarity',
+            'name',
+        ).values(
+            'id',
+            'name',
+            'measurement_unit',
+        )[:limit]
+    )
+
+
+def trigram_search(query, limit):
+    """
+    Нечёткий поиск ингредиентов.
+
+    На PostgreSQL использует `pg_trgm`, на остальных базах — индекс
+    в памяти процесса.
+    """
+    if connection.vendor == 'postgresql':
+        return postgres_trigram_search(query, limit)
+    return ingredient_trigram_index.search(query, limit)
+
+
+ingredient_index = IngredientPrefixIndex()
+ingredient_trigram_index = IngredientTrigramIndex()
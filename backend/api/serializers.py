@@ -1,23 +1,43 @@
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import UploadedFile
 from django.db import transaction
-from drf_extra_fields.fields import Base64ImageField
+from django.db.models import Manager, prefetch_related_objects
+from django.http import QueryDict
+from drf_extra_fields.fields import Base64FieldMixin, Base64ImageField
 from rest_framework import serializers
 from rest_framework.reverse import reverse
 from rest_framework.validators import UniqueTogetherValidator
 
+from api.cache import (
+    get_recipe_representations,
+    set_recipe_representations,
+)
 from api.constants import (
     AMOUNT_MAX,
     AMOUNT_MIN,
+    BASE64_HEADER,
     COOKING_TIME_MAX,
     COOKING_TIME_MIN,
+    RECIPE_BATCH_MAX,
+)
+from api.images import avatar_variants, recipe_image_variants
+from api.relations import (
+    FAVORITES,
+    SHOPPING_CART,
+    SUBSCRIPTIONS,
+    get_viewer_relations,
 )
+from api.uploads import parse_form_data, upload_too_large_message
 from recipes.models import (
     AuthorRecipeModel,
     FavoriteRecipe,
     Ingredient,
     Recipe,
     RecipeIngredient,
+    RecipeQuerySet,
     ShoppingCart,
+    ShoppingListIngredient,
     Tag,
 )
 from shortener.models import LinkMapped
@@ -27,10 +47,64 @@ from users.models import Subscriber
 User = get_user_model()
 
 
+class ImageVariantsField(serializers.Field):
+    """Ссылки на варианты изображения, до их готовности — на оригинал."""
+
+    def __init__(self, variants, **kwargs):
+        kwargs['source'] = '*'
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+        self.variants = variants
+
+    def to_representation(self, instance):
+        urls = self.variants.urls(instance)
+        request = self.context.get('request')
+        if urls is None or request is None:
+            return urls
+        return {
+            name: request.build_absolute_uri(url)
+            for name, url in urls.items()
+        }
+
+
+class ImageUploadField(Base64ImageField):
+    """
+    Картинка строкой base64 или файлом из `multipart/form-data`.
+
+    Размер строки base64 проверяется до декодирования, загруженный файл
+    проверяется Pillow с диска без чтения в память.
+    """
+
+    def to_internal_value(self, data):
+        if isinstance(data, UploadedFile):
+            if data.size > settings.IMAGE_UPLOAD_MAX_SIZE:
+                raise serializers.ValidationError(upload_too_large_message())
+            image = super(Base64FieldMixin, self).to_internal_value(data)
+            extension = image.image.format.lower()
+            extension = 'jpg' if extension == 'jpeg' else extension
+            if extension not in self.ALLOWED_TYPES:
+                raise serializers.ValidationError(self.INVALID_TYPE_MESSAGE)
+            image.name = f'{self.get_file_name(None)}.{extension}'
+            return image
+        if isinstance(data, str):
+            header_end = data.find(BASE64_HEADER)
+            if header_end >= 0:
+                header_end += len(BASE64_HEADER)
+            else:
+                header_end = 0
+            if (
+                (len(data) - header_end) * 3 // 4
+                > settings.IMAGE_UPLOAD_MAX_SIZE
+            ):
+                raise serializers.ValidationError(upload_too_large_message())
+        return super().to_internal_value(data)
+
+
 class UserSerializer(serializers.ModelSerializer):
     """Сериализатор для модели пользователя."""
 
     is_subscribed = serializers.SerializerMethodField()
+    avatar_variants = ImageVariantsField(avatar_variants)
 
     class Meta:
         model = User
@@ -42,21 +116,25 @@ class UserSerializer(serializers.ModelSerializer):
             'last_name',
             'is_subscribed',
             'avatar',
+            'avatar_variants',
         )
 
     def get_is_subscribed(self, obj):
         """Проверяет, подписан ли текущий пользователь на данного автора."""
-        current_user = self.context['request'].user
-        return (current_user
-                .is_authenticated and current_user != obj and current_user
-                .subscriber.filter(author=obj).exists()
-                )
+        request = self.context['request']
+        current_user = request.user
+        if not current_user.is_authenticated or current_user == obj:
+            return False
+        is_subscribed = getattr(obj, 'is_subscribed', None)
+        if is_subscribed is not None:
+            return is_subscribed
+        return get_viewer_relations(request).contains(SUBSCRIPTIONS, obj.id)
 
 
 class AvatarSerializer(serializers.ModelSerializer):
     """Сериализатор для аватара пользователя."""
 
-    avatar = Base64ImageField(allow_null=True)
+    avatar = ImageUploadField(allow_null=True)
 
     class Meta:
         model = User
@@ -90,10 +168,7 @@ class IngredientSerializer(serializers.ModelSerializer):
 class RecipeIngredientSerializer(serializers.ModelSerializer):
     """Сериализатор для ингредиентов при создании нового рецепта."""
 
-    id = serializers.PrimaryKeyRelatedField(
-        queryset=Ingredient.objects.all(),
-        source='ingredient'
-    )
+    id = serializers.IntegerField()
     amount = serializers.IntegerField(
         max_value=AMOUNT_MAX,
         min_value=AMOUNT_MIN,
@@ -127,10 +202,30 @@ class IngredientGetSerializer(serializers.ModelSerializer):
         )
 
 
+class ShoppingListSerializer(serializers.ModelSerializer):
+    """Сериализатор для отображения списка покупок."""
+
+    id = serializers.IntegerField(source='ingredient.id')
+    name = serializers.CharField(source='ingredient.name')
+    measurement_unit = serializers.CharField(
+        source='ingredient.measurement_unit'
+    )
+
+    class Meta:
+        model = ShoppingListIngredient
+        fields = (
+            'id',
+            'name',
+            'measurement_unit',
+            'amount'
+        )
+
+
 class ShortRecipeSerializer(serializers.ModelSerializer):
     """Сериализатор для краткого отображения рецепта."""
 
     image = serializers.ImageField(read_only=True)
+    image_variants = ImageVariantsField(recipe_image_variants)
 
     class Meta:
         model = Recipe
@@ -138,15 +233,25 @@ class ShortRecipeSerializer(serializers.ModelSerializer):
             'id',
             'name',
             'image',
+            'image_variants',
             'cooking_time'
         )
 
 
+class RecipeListSerializer(serializers.ListSerializer):
+    """Сериализатор списка рецептов с кэшем представлений."""
+
+    def to_representation(self, data):
+        recipes = data.all() if isinstance(data, Manager) else data
+        return self.child.represent(list(recipes))
+
+
 class RecipeSerializer(serializers.ModelSerializer):
     """Сериализатор для отображения рецепта."""
 
     author = UserSerializer(read_only=True)
     image = Base64ImageField()
+    image_variants = ImageVariantsField(recipe_image_variants)
     tags = TagSerializer(many=True, read_only=True)
     ingredients = IngredientGetSerializer(
         many=True,
@@ -166,21 +271,112 @@ class RecipeSerializer(serializers.ModelSerializer):
             'is_in_shopping_cart',
             'name',
             'image',
+            'image_variants',
             'text',
             'cooking_time',
         )
+        list_serializer_class = RecipeListSerializer
+
+    def to_representation(self, instance):
+        return self.represent([instance])[0]
+
+    def represent(self, recipes):
+        """
+        Представления рецептов для текущего пользователя.
+
+        Общая для всех пользователей часть берётся из кэша, для промахов
+        теги и ингредиенты предзагружаются одним набором запросов.
+        Флаги пользователя добавляются при каждом ответе.
+        """
+        origin = self.context['request'].build_absolute_uri('/')
+        representations = get_recipe_representations(
+            [recipe.id for recipe in recipes],
+            origin
+        )
+        misses = [
+            recipe for recipe in recipes
+            if recipe.id not in representations
+        ]
+        if misses:
+            prefetch_related_objects(
+                misses,
+                *RecipeQuerySet.content_lookups()
+            )
+            built = {
+                recipe.id: self.get_shared_representation(recipe)
+                for recipe in misses
+            }
+            set_recipe_representations(
+                {
+                    recipe.id: built[recipe.id]
+                    for recipe in misses
+                    if self.has_final_images(recipe)
+                },
+                origin
+            )
+            representations.update(built)
+        return [
+            self.add_user_fields(recipe, representations[recipe.id])
+            for recipe in recipes
+        ]
+
+    @staticmethod
+    def has_final_images(recipe):
+        """
+        Готовы ли варианты картинки рецепта и аватара автора.
+
+        Представления со ссылками на оригиналы вместо вариантов
+        не кэшируются.
+        """
+        return recipe_image_variants.is_ready(recipe) and (
+            not recipe.author.avatar
+            or avatar_variants.is_ready(recipe.author)
+        )
+
+    def get_shared_representation(self, recipe):
+        """Представление рецепта без полей, зависящих от пользователя."""
+        data = super().to_representation(recipe)
+        data['is_favorited'] = None
+        data['is_in_shopping_cart'] = None
+        data['author']['is_subscribed'] = None
+        return data
+
+    def add_user_fields(self, recipe, data):
+        """Добавляет к представлению рецепта флаги текущего пользователя."""
+        data = data.copy()
+        data['author'] = data['author'].copy()
+        data['author']['is_subscribed'] = (
+            self.fields['author'].get_is_subscribed(recipe.author)
+        )
+        data['is_favorited'] = self.get_is_favorited(recipe)
+        data['is_in_shopping_cart'] = self.get_is_in_shopping_cart(recipe)
+        return data
+
+    def get_user_flag(self, obj, flag, relation):
+        """
+        Возвращает флаг рецепта для текущего пользователя.
+
+        Берёт значение из аннотации `Recipe.objects.with_user_flags`,
+        а для неаннотированного объекта — из связей пользователя
+        в запросе.
+        """
+        value = getattr(obj, flag, None)
+        if value is not None:
+            return value
+        return get_viewer_relations(self.context['request']).contains(
+            relation,
+            obj.id
+        )
 
     def get_is_favorited(self, obj):
-        user = self.context['request'].user
-        return (user.is_authenticated and user.favorites.filter(recipe=obj)
-                .exists()
-                )
+        return self.get_user_flag(obj, 'is_favorited', FAVORITES)
 
     def get_is_in_shopping_cart(self, obj):
-        user = self.context['request'].user
-        return (user.is_authenticated and user.shopping_cart
-                .filter(recipe=obj).exists()
-                )
+        return self.get_user_flag(
+            obj,
+            'is_in_shopping_cart',
+            SHOPPING_CART
+        )
 
 
 class RecipeCreateSerializer(serializers.ModelSerializer):
@@ -189,15 +385,12 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
     author = serializers.HiddenField(
         default=serializers.CurrentUserDefault()
     )
-    tags = serializers.PrimaryKeyRelatedField(
-        queryset=Tag.objects.all(),
-        many=True
-    )
+    tags = serializers.ListField(child=serializers.IntegerField())
     ingredients = RecipeIngredientSerializer(
         many=True,
         source='recipe_ingredients'
     )
-    image = Base64ImageField()
+    image = ImageUploadField()
     cooking_time = serializers.IntegerField(
         max_value=COOKING_TIME_MAX,
         min_value=COOKING_TIME_MIN,
@@ -215,6 +408,11 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
             'author',
         )
 
+    def to_internal_value(self, data):
+        if isinstance(data, QueryDict):
+            data = parse_form_data(data)
+        return super().to_internal_value(data)
+
     def validate(self, data):
         """Проверяет корректность введённых данных при создании рецепта."""
         tags = data.get('tags')
@@ -231,15 +429,50 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError(
                 {'ingredients': 'Добавьте хотя бы один ингредиент.'}
             )
-        ingredient_ids = [
-            ingredient['ingredient'].id for ingredient in ingredients
-        ]
+        ingredient_ids = [ingredient['id'] for ingredient in ingredients]
         if len(ingredient_ids) != len(set(ingredient_ids)):
             raise serializers.ValidationError(
                 {'ingredients': 'Ингредиенты должны быть уникальными.'}
             )
+        errors = {}
+        data['tags'] = self.resolve_ids(Tag, tags, 'tags', errors)
+        ingredients_by_id = dict(zip(
+            ingredient_ids,
+            self.resolve_ids(
+                Ingredient,
+                ingredient_ids,
+                'ingredients',
+                errors
+            ),
+        ))
+        if errors:
+            raise serializers.ValidationError(errors)
+        data['recipe_ingredients'] = [
+            {
+                'ingredient': ingredients_by_id.get(ingredient['id']),
+                'amount': ingredient['amount'],
+            }
+            for ingredient in ingredients
+        ]
         return data
 
+    @staticmethod
+    def resolve_ids(model, ids, field, errors):
+        """
+        Объекты `model` по `ids` в том же порядке одним запросом.
+
+        Все отсутствующие `id` записываются одной ошибкой поля `field`
+        в `errors`.
+        """
+        objects = model.objects.in_bulk(ids)
+        missing = [str(pk) for pk in ids if pk not in objects]
+        if missing:
+            errors[field] = (
+                f'{model._meta.verbose_name_plural} не найдены: '
+                f'{", ".join(missing)}.'
+            )
+        return [objects.get(pk) for pk in ids]
+
     def create(self, validated_data):
         """Создает новый рецепт."""
         tags = validated_data.pop('tags')
@@ -259,10 +492,63 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
 
         tags = validated_data.pop('tags')
         ingredients = validated_data.pop('recipe_ingredients')
-        instance.tags.set(tags)
-        instance.ingredients.clear()
-        self.add_tags_and_ingredients_to_recipe(instance, tags, ingredients)
-        return super().update(instance, validated_data)
+        with transaction.atomic():
+            instance.tags.set(tags)
+            if self.update_ingredients(instance, ingredients):
+                ShoppingListIngredient.rebuild_for_recipe(instance)
+            return super().update(instance, validated_data)
+
+    @staticmethod
+    def update_ingredients(recipe, ingredients):
+        """
+        Приводит ингредиенты рецепта к `ingredients` по разнице.
+
+        Удаляет убранные ингредиенты, меняет изменившиеся количества
+        через `bulk_update` и добавляет новые, не трогая остальные
+        строки. Возвращает `True`, если ингредиенты изменились.
+        """
+        current = {
+            recipe_ingredient.ingredient_id: recipe_ingredient
+            for recipe_ingredient in RecipeIngredient.objects.filter(
+                recipe=recipe
+            )
+        }
+        amounts = {
+            ingredient['ingredient'].id: ingredient['amount']
+            for ingredient in ingredients
+        }
+        removed = current.keys() - amounts.keys()
+        changed = [
+            recipe_ingredient
+            for ingredient_id, recipe_ingredient in current.items()
+            if ingredient_id in amounts
+            and recipe_ingredient.amount != amounts[ingredient_id]
+        ]
+        added = [
+            ingredient for ingredient in ingredients
+            if ingredient['ingredient'].id not in current
+        ]
+        if removed:
+            RecipeIngredient.objects.filter(
+                recipe=recipe,
+                ingredient_id__in=removed
+            ).delete()
+        if changed:
+            for recipe_ingredient in changed:
+                recipe_ingredient.amount = amounts[
+                    recipe_ingredient.ingredient_id
+                ]
+            RecipeIngredient.objects.bulk_update(changed, ['amount'])
+        if added:
+            RecipeIngredient.objects.bulk_create(
+                RecipeIngredient(
+                    recipe=recipe,
+                    ingredient=ingredient['ingredient'],
+                    amount=ingredient['amount'],
+                )
+                for ingredient in added
+            )
+        return bool(removed or changed or added)
 
     @staticmethod
     def add_tags_and_ingredients_to_recipe(recipe, tags, ingredients):
@@ -309,10 +595,8 @@ class AuthorRecipeSerializer(serializers.ModelSerializer):
     def validate(self, data):
         """Проверяет, что рецепт ещё не добавлен в избранное или корзину."""
         recipe = data['recipe']
-        user = self.context['request'].user
-        if self.Meta.model.objects.filter(
-                author=user,
-                recipe=recipe).exists():
+        relations = get_viewer_relations(self.context['request'])
+        if relations.contains(self.relation, recipe.id):
             raise serializers.ValidationError(
                 f'Рецепт уже добавлен в {self.add_recipe}.'
             )
@@ -330,6 +614,7 @@ class FavoriteSerializer(AuthorRecipeSerializer):
     """Сериализатор для добавления рецепта в избранное."""
 
     add_recipe = 'избранное'
+    relation = FAVORITES
 
     class Meta(AuthorRecipeSerializer.Meta):
         model = FavoriteRecipe
@@ -339,6 +624,7 @@ class ShoppingCartSerializer(AuthorRecipeSerializer):
     """Сериализатор для добавления рецепта в корзину покупок."""
 
     add_recipe = 'корзину покупок'
+    relation = SHOPPING_CART
 
     class Meta(AuthorRecipeSerializer.Meta):
         model = ShoppingCart
@@ -348,9 +634,7 @@ class UserRecipeSerializer(UserSerializer):
     """Сериализатор для отображения пользователя с его рецептами."""
 
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.IntegerField(
-        read_only=True, source='recipes.count'
-    )
+    recipes_count = serializers.SerializerMethodField()
 
     class Meta:
         model = User
@@ -364,16 +648,29 @@ class UserRecipeSerializer(UserSerializer):
             'recipes',
             'recipes_count',
             'avatar',
+            'avatar_variants',
         )
 
-    def get_recipes(self, obj):
-        """Получает рецепты пользователя с возможностью
-        ограничения по количеству."""
-        request = self.context.get('request')
-        recipes = obj.recipes.all()
+    @staticmethod
+    def get_recipes_limit(request):
+        """Ограничение числа рецептов из параметра `recipes_limit`."""
         recipes_limit = request.query_params.get('recipes_limit')
         if recipes_limit and recipes_limit.isdigit():
-            recipes = recipes[:int(recipes_limit)]
+            return int(recipes_limit)
+        return None
+
+    def get_recipes(self, obj):
+        """Получает рецепты пользователя с возможностью
+        ограничения по количеству.
+
+        Использует рецепты, предзагруженные в `limited_recipes`.
+        """
+        recipes = getattr(obj, 'limited_recipes', None)
+        if recipes is None:
+            recipes = obj.recipes.all()
+            recipes_limit = self.get_recipes_limit(self.context['request'])
+            if recipes_limit is not None:
+                recipes = recipes[:recipes_limit]
 
         return ShortRecipeSerializer(
             recipes,
@@ -381,6 +678,22 @@ class UserRecipeSerializer(UserSerializer):
             context=self.context
         ).data
 
+    def get_recipes_count(self, obj):
+        recipes_count = getattr(obj, 'recipes_count', None)
+        if recipes_count is not None:
+            return recipes_count
+        return obj.recipes.count()
+
+
+class RecipeBatchSerializer(serializers.Serializer):
+    """Список `id` рецептов для пакетного добавления или удаления."""
+
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=RECIPE_BATCH_MAX,
+    )
+
 
 class ShortLinkSerializer(serializers.ModelSerializer):
     """Сериализатор для создания короткой ссылки."""
@@ -397,7 +710,7 @@ class ShortLinkSerializer(serializers.ModelSerializer):
         return request.build_absolute_uri(
             reverse(
                 'shortener:load_url',
-                args=[obj.url_hash]
+                args=[obj.code]
             )
         )
 
@@ -0,0 +1,188 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from api.cache import (
+    bump_cache_version_on_commit,
+    invalidate_recipe_representations,
+    user_namespace,
+)
+from api.images import avatar_variants, recipe_image_variants
+from api.utils import shopping_list_documents
+from api.constants import (
+    INGREDIENT_INDEX_CACHE,
+    RECIPE_COUNT_CACHE,
+    RECIPE_REPR_CACHE,
+    TAG_CACHE,
+)
+from recipes.models import (
+    FavoriteRecipe,
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    ShoppingCart,
+    Tag,
+    catalog_changed,
+    shopping_list_changed,
+)
+
+User = get_user_model()
+
+
+@receiver(post_save, sender=Recipe)
+def invalidate_recipe_count_on_save(sender, **kwargs):
+    """
+    Сбрасывает кэш количества рецептов при добавлении и изменении рецепта.
+
+    От названия и описания зависит число результатов поиска.
+    """
+    bump_cache_version_on_commit(RECIPE_COUNT_CACHE)
+
+
+@receiver(post_delete, sender=Recipe)
+def invalidate_recipe_count_on_delete(sender, **kwargs):
+    """Сбрасывает кэш количества рецептов при удалении рецепта."""
+    bump_cache_version_on_commit(RECIPE_COUNT_CACHE)
+
+
+@receiver(post_save, sender=FavoriteRecipe)
+@receiver(post_save, sender=ShoppingCart)
+@receiver(post_delete, sender=FavoriteRecipe)
+@receiver(post_delete, sender=ShoppingCart)
+def invalidate_user_recipe_count(sender, instance, **kwargs):
+    """
+    Сбрасывает кэш количества рецептов с фильтрами пользователя.
+
+    Избранное и корзина влияют только на количества с
+    `is_favorited` и `is_in_shopping_cart` их владельца.
+    """
+    bump_cache_version_on_commit(
+        user_namespace(RECIPE_COUNT_CACHE, instance.author_id)
+    )
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def invalidate_recipe_count_on_tags(sender, action, **kwargs):
+    """Сбрасывает кэш количества рецептов при изменении тегов."""
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        bump_cache_version_on_commit(RECIPE_COUNT_CACHE)
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def invalidate_recipe_representation(sender, instance, **kwargs):
+    """Сбрасывает кэш представления изменённого рецепта."""
+    invalidate_recipe_representations([instance.id])
+
+
+def touch_recipe(recipe_id):
+    """
+    Сбрасывает кэш представления рецепта и обновляет `updated_at`.
+
+    От `updated_at` зависит `ETag` рецепта, а изменение связей
+    не сохраняет сам рецепт.
+    """
+    Recipe.objects.filter(pk=recipe_id).update(updated_at=timezone.now())
+    invalidate_recipe_representations([recipe_id])
+
+
+@receiver(post_save, sender=RecipeIngredient)
+@receiver(post_delete, sender=RecipeIngredient)
+def invalidate_recipe_representation_on_ingredient(
+    sender,
+    instance,
+    **kwargs
+):
+    """Сбрасывает кэш представления рецепта при изменении ингредиентов."""
+    touch_recipe(instance.recipe_id)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def invalidate_recipe_representation_on_m2m(
+    sender,
+    instance,
+    action,
+    reverse,
+    **kwargs
+):
+    """Сбрасывает кэш представлений рецептов при изменении связей."""
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if reverse:
+        bump_cache_version_on_commit(RECIPE_REPR_CACHE)
+    else:
+        touch_recipe(instance.id)
+
+
+@receiver(post_save, sender=User)
+def invalidate_author_recipe_representations(
+    sender,
+    instance,
+    created,
+    update_fields,
+    **kwargs
+):
+    """Сбрасывает кэш представлений рецептов автора при смене профиля."""
+    if created or (update_fields and set(update_fields) == {'last_login'}):
+        return
+    invalidate_recipe_representations(
+        Recipe.objects.filter(author=instance).values_list('id', flat=True)
+    )
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def invalidate_all_recipe_representations(sender, **kwargs):
+    """Сбрасывает кэш всех представлений рецептов."""
+    bump_cache_version_on_commit(RECIPE_REPR_CACHE)
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+@receiver(catalog_changed, sender=Ingredient)
+def invalidate_ingredient_index(sender, **kwargs):
+    """Перестраивает индекс ингредиентов при изменении каталога."""
+    bump_cache_version_on_commit(INGREDIENT_INDEX_CACHE)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+@receiver(catalog_changed, sender=Tag)
+def invalidate_tags(sender, **kwargs):
+    """Меняет версию списка тегов."""
+    bump_cache_version_on_commit(TAG_CACHE)
+
+
+@receiver(post_save, sender=Recipe)
+def build_recipe_image_variants(sender, instance, **kwargs):
+    """Ставит в очередь варианты новой картинки рецепта."""
+    recipe_image_variants.schedule(instance)
+
+
+@receiver(post_save, sender=User)
+def build_avatar_variants(sender, instance, **kwargs):
+    """Ставит в очередь варианты нового аватара."""
+    avatar_variants.schedule(instance)
+
+
+@receiver(post_delete, sender=Recipe)
+def delete_recipe_image_variants(sender, instance, **kwargs):
+    """Удаляет варианты картинки удалённого рецепта."""
+    recipe_image_variants.delete(instance)
+
+
+@receiver(post_delete, sender=User)
+def delete_avatar_variants(sender, instance, **kwargs):
+    """Удаляет варианты аватара удалённого пользователя."""
+    avatar_variants.delete(instance)
+
+
+@receiver(shopping_list_changed)
+def invalidate_shopping_list_documents(sender, authors, **kwargs):
+    """Меняет версии PDF со списками покупок после фиксации."""
+    transaction.on_commit(lambda: shopping_list_documents.changed(authors))
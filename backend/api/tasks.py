@@ -0,0 +1,44 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+
+class WorkerPool:
+    """
+    Пул фоновых потоков с числом потоков из настройки `workers_setting`.
+
+    Пул создаётся при первом вызове, то есть уже в процессе воркера.
+    При нуле потоков функция выполняется сразу.
+    """
+
+    def __init__(self, name, workers_setting):
+        self.name = name
+        self.workers_setting = workers_setting
+        self.executor = None
+        self.lock = threading.Lock()
+
+    def submit(self, function, *args):
+        workers = getattr(settings, self.workers_setting)
+        if workers <= 0:
+            function(*args)
+            return
+        with self.lock:
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(
+                    max_workers=workers,
+                    thread_name_prefix=self.name,
+                )
+        self.executor.submit(self.run, function, *args)
+
+    def run(self, function, *args):
+        try:
+            function(*args)
+        except Exception as e:
+            logger.error(f'Ошибка фоновой задачи {self.name}: {str(e)}')
+        finally:
+            close_old_connections()
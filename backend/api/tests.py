@@ -0,0 +1,111 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from api.utils import ShoppingListItem, ingredients_list
+from recipes.models import (
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    ShoppingCart,
+    ShoppingListIngredient,
+)
+
+User = get_user_model()
+
+CART_SIZES = (1, 50)
+INGREDIENTS_PER_RECIPE = 5
+
+
+class ShoppingListQueryCountTest(TestCase):
+    """Список покупок считается одним запросом при любом размере корзины."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email='cart@example.com',
+            username='cart',
+            first_name='cart',
+            last_name='cart',
+            password='cart-password',
+        )
+        cls.ingredients = [
+            Ingredient.objects.create(
+                name=f'ingredient {index}',
+                measurement_unit='г'
+            )
+            for index in range(INGREDIENTS_PER_RECIPE)
+        ]
+        cls.recipes = [
+            Recipe.objects.create(
+                author=cls.user,
+                name=f'recipe {index}',
+                text='text',
+                cooking_time=1,
+                image='recipes/image.png',
+            )
+            for index in range(max(CART_SIZES))
+        ]
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(recipe=recipe, ingredient=ingredient, amount=2)
+            for recipe in cls.recipes
+            for ingredient in cls.ingredients
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def fill_cart(self, size):
+        ShoppingCart.objects.filter(author=self.user).delete()
+        ShoppingCart.add_recipes(
+            self.user,
+            [recipe.id for recipe in self.recipes[:size]]
+        )
+
+    def test_calculate_is_one_query(self):
+        for size in CART_SIZES:
+            with self.subTest(size=size):
+                self.fill_cart(size)
+                with self.assertNumQueries(1):
+                    rows = list(ShoppingListIngredient.calculate([
+                        self.user.id
+                    ]))
+                self.assertEqual(
+                    sorted(rows),
+                    [
+                        (self.user.id, ingredient.id, 2 * size)
+                        for ingredient in self.ingredients
+                    ],
+                )
+
+    def test_ingredients_list_is_one_ordered_query(self):
+        for size in CART_SIZES:
+            with self.subTest(size=size):
+                self.fill_cart(size)
+                with self.assertNumQueries(1):
+                    items = ingredients_list(self.user)
+                self.assertEqual(
+                    items,
+                    [
+                        ShoppingListItem(ingredient.name, 2 * size, 'г')
+                        for ingredient in self.ingredients
+                    ],
+                )
+
+    def test_download_query_count_does_not_grow(self):
+        counts = []
+        for size in CART_SIZES:
+            self.fill_cart(size)
+            cache.clear()
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(
+                    '/api/recipes/download_shopping_cart/'
+                )
+            self.assertEqual(response.status_code, 200)
+            counts.append(len(queries))
+        self.assertEqual(counts, [1] * len(CART_SIZES))
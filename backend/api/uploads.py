@@ -0,0 +1,78 @@
+import json
+
+from django.conf import settings
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from django.template.defaultfilters import filesizeformat
+from rest_framework.exceptions import ValidationError
+
+from api.constants import IMAGE_SIGNATURES, MULTIPART_JSON_FIELDS
+
+UPLOAD_TOO_LARGE_MESSAGE = 'Размер изображения не должен превышать {}.'
+UPLOAD_INVALID_MESSAGE = 'Загрузите корректное изображение.'
+
+
+def upload_too_large_message():
+    """Сообщение о превышении `IMAGE_UPLOAD_MAX_SIZE` в КБ или МБ."""
+    return UPLOAD_TOO_LARGE_MESSAGE.format(
+        filesizeformat(settings.IMAGE_UPLOAD_MAX_SIZE)
+    )
+
+
+def is_image_header(data):
+    """Начинаются ли данные с сигнатуры PNG, JPEG, GIF или WebP."""
+    return data.startswith(IMAGE_SIGNATURES) or (
+        data[:4] == b'RIFF' and data[8:12] == b'WEBP'
+    )
+
+
+class ImageUploadHandler(TemporaryFileUploadHandler):
+    """
+    Загрузка файла сразу во временный файл с проверкой по частям.
+
+    Сигнатура изображения проверяется по первой части, размер — по мере
+    получения, поэтому неподходящий файл отклоняется, не будучи
+    прочитанным целиком.
+    """
+
+    def receive_data_chunk(self, raw_data, start):
+        if start == 0 and not is_image_header(raw_data):
+            raise ValidationError(
+                {self.field_name: [UPLOAD_INVALID_MESSAGE]}
+            )
+        if start + len(raw_data) > settings.IMAGE_UPLOAD_MAX_SIZE:
+            raise ValidationError(
+                {self.field_name: [upload_too_large_message()]}
+            )
+        return super().receive_data_chunk(raw_data, start)
+
+
+class ImageUploadMixin:
+    """
+    Приём файлов `multipart/form-data` через `ImageUploadHandler`.
+
+    Обработчик ставится до аутентификации: проверка CSRF читает
+    `request.POST`, после чего заменить обработчики уже нельзя.
+    """
+
+    def initialize_request(self, request, *args, **kwargs):
+        if request.content_type.startswith('multipart/form-data'):
+            request.upload_handlers = [ImageUploadHandler(request)]
+        return super().initialize_request(request, *args, **kwargs)
+
+
+def parse_form_data(data):
+    """
+    Данные `multipart/form-data` в виде JSON-запроса.
+
+    Поля из `MULTIPART_JSON_FIELDS` (`ingredients`, `tags`) передаются
+    строками JSON того же вида, что и в JSON-запросе, остальные поля
+    и файлы — частями формы.
+    """
+    data = data.dict()
+    for field in MULTIPART_JSON_FIELDS:
+        if field in data:
+            try:
+                data[field] = json.loads(data[field])
+            except ValueError:
+                raise ValidationError({field: ['Некорректный JSON.']})
+    return data
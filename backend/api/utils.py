@@ -1,12 +1,21 @@
+import os
+import threading
 from collections import namedtuple
 from io import BytesIO
 
+from django.conf import settings
+from django.core.cache import cache
 from reportlab.lib.pagesizes import letter
 from reportlab.lib.units import inch
 from reportlab.pdfbase import pdfmetrics
 from reportlab.pdfbase.ttfonts import TTFont
 from reportlab.platypus import SimpleDocTemplate, Table, TableStyle
 
+from api.cache import (
+    bump_cache_version,
+    get_cache_version,
+    record_cache_stats,
+)
 from api.constants import (
     TITLE,
     HEADER_TEXT,
@@ -32,24 +41,81 @@ from api.constants import (
     GRID,
     DATA_COLUMN1,
     DATA_COLUMN2,
+    COLUMN_WIDTHS,
+    TABLE_CHUNK_ROWS,
+    INGREDIENT_INDEX_CACHE,
+    SHOPPING_LIST_CACHE,
 )
+from api.tasks import WorkerPool
+from recipes.models import ShoppingListIngredient
+
+TABLE_STYLE = [
+    ("BOX", (0, 0), (-1, -1), 0, BOX_COLOR),
+    ("VALIGN", (0, 0), (-1, -1), VALIGN),
+    ("ALIGN", (0, 0), (-1, -1), ALIGN),
+    ("TOPPADDING", (0, 0), (-1, -1), TOPPADDING),
+    ("BOTTOMPADDING", (0, 0), (-1, -1), BOTTOMPADDING),
+    ("LEFTPADDING", (0, 0), (-1, -1), LEFTPADDING),
+    ('FONTNAME', (0, 0), (-1, -1), FONTNAME),
+    ("FONTSIZE", (0, 0), (-1, -1), FONTSIZE),
+    ("LINEBELOW", (0, -1), (-1, -1), LINEBELOW, LINEBELOW_COLOR),
+    ('GRID', (0, 0), (-1, -1), GRID, GRID_COLOR)
+]
 
 
-def ingredients_list(recipe_list):
-    ingredients = {}
-    for recipe in recipe_list:
-        for _ in recipe.recipe_ingredients.select_related('ingredient').all():
-            key = (_.ingredient.name, _.ingredient.measurement_unit)
-            if key not in ingredients:
-                ingredients[key] = 0
-            ingredients[key] += _.amount
+def ingredients_list(user):
+    """
+    Список покупок пользователя или пользователя с id `user`.
+
+    Читает материализованный `ShoppingListIngredient` и возвращает
+    `ShoppingListItem` в порядке названий.
+    """
+    return [
+        ShoppingListItem(*row)
+        for row in ShoppingListIngredient.objects.filter(
+            author=user
+        ).values_list(
+            'ingredient__name',
+            'amount',
+            'ingredient__measurement_unit',
+        )
+    ]
 
-    return [ShoppingListItem(name, amount, measurement_unit)
-            for ((name, measurement_unit), amount) in ingredients.items()]
 
+class ShoppingListRenderer:
+    """
+    PDF-рендерер списка покупок.
 
-def pdf_shopping_list(shopping_list, user):
+    Шрифт регистрируется один раз на процесс, стили таблиц собираются
+    при создании рендерера. Длинный список разбивается на таблицы по
+    `TABLE_CHUNK_ROWS` строк, чтобы перенос по страницам не
+    перекомпоновывал весь остаток таблицы.
+    """
 
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.header_style = TableStyle(TABLE_STYLE + [
+            ('TEXTCOLOR', (-1, 0), (0, 0), TEXT_COLOR),
+            ('BACKGROUND', (0, 1), (-1, -1), BACKGROUND_COLOR),
+        ])
+        self.body_style = TableStyle(TABLE_STYLE + [
+            ('BACKGROUND', (0, 0), (-1, -1), BACKGROUND_COLOR),
+        ])
+
+    def register_fonts(self):
+        """Регистрирует шрифт документа, если он ещё не загружен."""
+        if FONT_FAMILY in pdfmetrics.getRegisteredFontNames():
+            return
+        with self.lock:
+            if FONT_FAMILY not in pdfmetrics.getRegisteredFontNames():
+                pdfmetrics.registerFont(
+                    TTFont(
+                        FONT_FAMILY,
+                        os.path.join(settings.BASE_DIR, REGISTER_FONT_URL)
+                    )
+                )
+
+    @staticmethod
     def header_footer(canvas, doc):
         canvas.saveState()
         canvas.setFont(FONT_FAMILY, FONT_SIZE)
@@ -58,47 +124,135 @@ def pdf_shopping_list(shopping_list, user):
         canvas.drawString(inch, TEXT_CANVAS * inch, FOOTER_TEXT)
         canvas.restoreState()
 
-    pdfmetrics.registerFont(
-        TTFont(FONT_FAMILY, REGISTER_FONT_URL)
-    )
-    buffer = BytesIO()
-    doc = SimpleDocTemplate(
-        buffer,
-        pagesize=letter,
-        title=TITLE
-    )
-
-    data = [
-        [DATA_COLUMN1, DATA_COLUMN2]
-    ]
+    def tables(self, shopping_list):
+        """Таблицы документа по `TABLE_CHUNK_ROWS` строк."""
+        rows = [[DATA_COLUMN1, DATA_COLUMN2]]
+        style = self.header_style
+        for item in shopping_list:
+            rows.append(
+                [item.name, f'{item.amount} {item.measurement_unit}']
+            )
+            if len(rows) == TABLE_CHUNK_ROWS:
+                yield Table(rows, colWidths=COLUMN_WIDTHS, style=style)
+                rows, style = [], self.body_style
+        if rows:
+            yield Table(rows, colWidths=COLUMN_WIDTHS, style=style)
+
+    def render(self, shopping_list, output):
+        """Записывает PDF со списком покупок в файловый объект."""
+        self.register_fonts()
+        SimpleDocTemplate(
+            output,
+            pagesize=letter,
+            title=TITLE
+        ).build(
+            list(self.tables(shopping_list)),
+            onFirstPage=self.header_footer,
+            onLaterPages=self.header_footer
+        )
+
+    def render_to_bytes(self, shopping_list):
+        """Возвращает PDF со списком покупок."""
+        output = BytesIO()
+        self.render(shopping_list, output)
+        return output.getvalue()
+
+
+shopping_list_renderer = ShoppingListRenderer()
+
+
+class ShoppingListDocuments:
+    """
+    Кэш PDF со списками покупок.
+
+    Документ хранится в кэше под ключом из версии списка покупок
+    пользователя, общей версии всех списков и версии каталога
+    ингредиентов, те же версии дают `ETag`. Версии меняются после
+    фиксации изменений списка покупок, и если пользователь уже скачивал
+    документ, новый строится в фоне заранее.
+    """
+
+    def __init__(self):
+        self.pool = WorkerPool(
+            'shopping-list-pdf',
+            'SHOPPING_LIST_PDF_WORKERS'
+        )
+
+    @staticmethod
+    def user_namespace(user_id):
+        return f'{SHOPPING_LIST_CACHE}:{user_id}'
+
+    @staticmethod
+    def active_key(user_id):
+        return f'{SHOPPING_LIST_CACHE}:{user_id}:active'
+
+    def version(self, user_id):
+        return (
+            get_cache_version(SHOPPING_LIST_CACHE),
+            get_cache_version(self.user_namespace(user_id)),
+            get_cache_version(INGREDIENT_INDEX_CACHE),
+        )
+
+    @staticmethod
+    def key(user_id, version):
+        return ':'.join(
+            str(part) for part in (SHOPPING_LIST_CACHE, 'pdf', user_id)
+            + version
+        )
+
+    def get(self, user_id, version):
+        """Документ версии `version`: из кэша или построенный заново."""
+        content = cache.get(self.key(user_id, version))
+        if content is None:
+            record_cache_stats(SHOPPING_LIST_CACHE, misses=1)
+            content = self.render(user_id, version)
+        else:
+            record_cache_stats(SHOPPING_LIST_CACHE, hits=1)
+        cache.set(
+            self.active_key(user_id),
+            True,
+            settings.SHOPPING_LIST_PDF_CACHE_TIMEOUT
+        )
+        return content
+
+    def render(self, user_id, version):
+        """
+        Строит документ и кэширует его под версией `version`.
+
+        Версия читается до списка покупок, поэтому под ней никогда не
+        оказывается документ старше неё.
+        """
+        content = shopping_list_renderer.render_to_bytes(
+            ingredients_list(user_id)
+        )
+        cache.set(
+            self.key(user_id, version),
+            content,
+            settings.SHOPPING_LIST_PDF_CACHE_TIMEOUT
+        )
+        return content
+
+    def prerender(self, user_id):
+        version = self.version(user_id)
+        if cache.get(self.key(user_id, version)) is None:
+            self.render(user_id, version)
+
+    def changed(self, authors):
+        """Меняет версии списков покупок `authors` или всех."""
+        if authors is None:
+            bump_cache_version(SHOPPING_LIST_CACHE)
+            return
+        for author_id in authors:
+            bump_cache_version(self.user_namespace(author_id))
+        active = cache.get_many(
+            [self.active_key(author_id) for author_id in authors]
+        )
+        for author_id in authors:
+            if self.active_key(author_id) in active:
+                self.pool.submit(self.prerender, author_id)
+
 
-    for ingredient in shopping_list:
-        data.append([ingredient[0], f'{ingredient[1]} {ingredient[2]}'])
-
-    table = Table(data)
-    table.setStyle(TableStyle([
-        ('TEXTCOLOR', (-1, 0), (0, 0), TEXT_COLOR),
-        ("BOX", (0, 0), (-1, -1), 0, BOX_COLOR),
-        ("VALIGN", (0, 0), (-1, -1), VALIGN),
-        ("ALIGN", (0, 0), (-1, -1), ALIGN),
-        ("TOPPADDING", (0, 0), (-1, -1), TOPPADDING),
-        ("BOTTOMPADDING", (0, 0), (-1, -1), BOTTOMPADDING),
-        ("LEFTPADDING", (0, 0), (-1, -1), LEFTPADDING),
-        ('FONTNAME', (0, 0), (-1, -1), FONTNAME),
-        ("FONTSIZE", (0, 0), (-1, -1), FONTSIZE),
-        ("LINEBELOW", (0, -1), (-1, -1), LINEBELOW, LINEBELOW_COLOR),
-        ('BACKGROUND', (0, 1), (-1, -1), BACKGROUND_COLOR),
-        ('GRID', (0, 0), (-1, -1), GRID, GRID_COLOR)
-    ]))
-
-    doc.build(
-        [table],
-        onFirstPage=header_footer,
-        onLaterPages=header_footer
-    )
-    buffer.seek(0)
-
-    return buffer
+shopping_list_documents = ShoppingListDocuments()
 
 
 ShoppingListItem = namedtuple(
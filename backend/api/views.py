@@ -1,4 +1,15 @@
+from io import BytesIO
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import (
+    BooleanField,
+    Count,
+    Prefetch,
+    Value,
+    prefetch_related_objects,
+)
 from django.http import FileResponse
 from django.shortcuts import get_object_or_404
 from django.urls import reverse
@@ -6,6 +17,7 @@ from django_filters.rest_framework import DjangoFilterBackend
 from djoser import views as djoser_views
 from rest_framework import permissions, status, viewsets
 from rest_framework.decorators import action
+from rest_framework.parsers import JSONParser, MultiPartParser
 from rest_framework.permissions import (
     AllowAny,
     IsAuthenticated,
@@ -13,22 +25,55 @@ from rest_framework.permissions import (
 )
 from rest_framework.response import Response
 
+from api.cache import (
+    bump_cache_version_on_commit,
+    get_cache_version,
+    user_namespace,
+)
+from api.conditional import (
+    VersionedViewSetMixin,
+    conditional_response,
+    make_etag,
+)
+from api.constants import (
+    BATCH_ADDED,
+    BATCH_ALREADY_ADDED,
+    BATCH_NOT_ADDED,
+    BATCH_NOT_FOUND,
+    BATCH_REMOVED,
+    INGREDIENT_INDEX_CACHE,
+    RECIPE_COUNT_CACHE,
+    RECIPE_REPR_CACHE,
+    SHOPPING_LIST_CACHE,
+    TAG_CACHE,
+    TRIGRAM_SEARCH_LIMIT,
+)
 from api.filters import IngredientFilter, RecipeFilter
 from api.paginations import FoodgramPagination
 from api.permissions import IsOwnerOrReadOnly
+from api.relations import (
+    FAVORITES,
+    SHOPPING_CART,
+    SUBSCRIPTIONS,
+    get_viewer_relations,
+)
+from api.search import ingredient_index, trigram_search
 from api.serializers import (
     AvatarSerializer,
     FavoriteSerializer,
     IngredientSerializer,
+    RecipeBatchSerializer,
     RecipeCreateSerializer,
     RecipeSerializer,
     ShoppingCartSerializer,
+    ShoppingListSerializer,
     ShortLinkSerializer,
     SubscribeSerializer,
     TagSerializer,
     UserRecipeSerializer,
 )
-from api.utils import ingredients_list, pdf_shopping_list
+from api.uploads import ImageUploadMixin
+from api.utils import shopping_list_documents
 from recipes.models import (
     FavoriteRecipe,
     Ingredient,
@@ -42,10 +87,11 @@ from users.models import Subscriber
 User = get_user_model()
 
 
-class UserViewSet(djoser_views.UserViewSet):
+class UserViewSet(ImageUploadMixin, djoser_views.UserViewSet):
     """Вьюсет для управления пользователями."""
 
     pagination_class = FoodgramPagination
+    cursor_ordering = ('id',)
 
     @action(
         methods=['put'],
@@ -87,23 +133,32 @@ class UserViewSet(djoser_views.UserViewSet):
         """Получение списка подписок пользователя."""
         queryset = User.objects.filter(
             subscribers__user=request.user
-        ).prefetch_related('recipes').order_by(
+        ).annotate(
+            recipes_count=Count('recipes'),
+            is_subscribed=Value(True, output_field=BooleanField()),
+        ).order_by(
             'id')
 
         page = self.paginate_queryset(queryset)
-        if page is not None:
-            serializer = UserRecipeSerializer(
-                page,
-                many=True,
-                context={'request': request}
+        authors = list(queryset) if page is None else page
+        prefetch_related_objects(
+            authors,
+            Prefetch(
+                'recipes',
+                queryset=Recipe.objects.latest_by_author(
+                    [author.id for author in authors],
+                    UserRecipeSerializer.get_recipes_limit(request),
+                ),
+                to_attr='limited_recipes',
             )
-            return self.get_paginated_response(serializer.data)
-
+        )
         serializer = UserRecipeSerializer(
-            queryset,
+            authors,
             many=True,
             context={'request': request}
         )
+        if page is not None:
+            return self.get_paginated_response(serializer.data)
         return Response(serializer.data)
 
     @action(
@@ -121,22 +176,24 @@ class UserViewSet(djoser_views.UserViewSet):
         )
         serializer.is_valid(raise_exception=True)
         serializer.save()
+        get_viewer_relations(request).add(SUBSCRIPTIONS, author.id)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     @subscribe.mapping.delete
     def unsubscribe(self, request, id):
         """Отписка от автора по его ID."""
         author = get_object_or_404(User, id=id)
-        subscription = Subscriber.objects.filter(
-            user=request.user,
-            author=author
-        )
-        if not subscription.exists():
+        relations = get_viewer_relations(request)
+        if not relations.contains(SUBSCRIPTIONS, author.id):
             return Response(
                 {'errors': 'Вы не подписаны на этого пользователя.'},
                 status=status.HTTP_400_BAD_REQUEST
             )
-        subscription.delete()
+        Subscriber.objects.filter(
+            user=request.user,
+            author=author
+        ).delete()
+        relations.remove(SUBSCRIPTIONS, author.id)
         return Response(status=status.HTTP_204_NO_CONTENT)
 
     @action(
@@ -150,33 +207,120 @@ class UserViewSet(djoser_views.UserViewSet):
         return Response(serializer.data)
 
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+class TagViewSet(VersionedViewSetMixin, viewsets.ReadOnlyModelViewSet):
     """Вьюсет для просмотра тегов."""
 
+    version_namespace = TAG_CACHE
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     permission_classes = [permissions.AllowAny]
 
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientViewSet(
+    VersionedViewSetMixin,
+    viewsets.ReadOnlyModelViewSet
+):
     """Вьюсет для просмотра ингредиентов."""
 
+    version_namespace = INGREDIENT_INDEX_CACHE
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     filter_backends = [DjangoFilterBackend]
     filterset_class = IngredientFilter
     permission_classes = [permissions.AllowAny]
 
+    def list(self, request, *args, **kwargs):
+        """
+        Список ингредиентов.
+
+        Поиск по началу названия (`name`) обслуживается индексом в памяти
+        процесса, нечёткий поиск (`q`) ранжирует по сходству триграмм;
+        `limit` ограничивает число результатов.
+        """
+        query = request.query_params.get('q')
+        name = request.query_params.get('name')
+        if not query and not name:
+            return super().list(request, *args, **kwargs)
+        limit = request.query_params.get('limit')
+        max_limit = settings.INGREDIENT_SEARCH_MAX_LIMIT
+        limit = (
+            min(int(limit), max_limit) if limit and limit.isdigit()
+            else None
+        )
+        if query:
+            return conditional_response(
+                request,
+                self.get_etag(request),
+                lambda: Response(
+                    trigram_search(query, limit or TRIGRAM_SEARCH_LIMIT)
+                ),
+            )
+        return conditional_response(
+            request,
+            self.get_etag(request),
+            lambda: Response(ingredient_index.search(name, limit)),
+        )
+
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(ImageUploadMixin, viewsets.ModelViewSet):
     """Вьюсет для управления рецептами."""
 
     queryset = Recipe.objects.all()
+    parser_classes = [JSONParser, MultiPartParser]
     pagination_class = FoodgramPagination
+    count_cache_namespace = RECIPE_COUNT_CACHE
+    count_cache_user_params = ('is_favorited', 'is_in_shopping_cart')
+    cursor_excluded_params = ('search',)
     filter_backends = [DjangoFilterBackend]
     filterset_class = RecipeFilter
     permission_classes = [IsAuthenticatedOrReadOnly, IsOwnerOrReadOnly]
 
+    def get_queryset(self):
+        """Рецепты с флагами избранного и корзины текущего пользователя."""
+        if self.action in ('list', 'retrieve'):
+            return Recipe.objects.for_reading(self.request.user)
+        return Recipe.objects.with_user_flags(self.request.user)
+
+    def retrieve(self, request, *args, **kwargs):
+        """
+        Рецепт с поддержкой `If-None-Match`.
+
+        `ETag` строится из `updated_at` рецепта, версии кэша
+        представлений, профиля автора и флагов текущего пользователя,
+        поэтому 304 отдаётся до загрузки тегов и ингредиентов.
+        """
+        recipe = self.get_object()
+        author = recipe.author
+        is_subscribed = (
+            request.user.is_authenticated
+            and request.user != author
+            and get_viewer_relations(request).contains(
+                SUBSCRIPTIONS,
+                author.id
+            )
+        )
+        etag = make_etag(
+            recipe.id,
+            recipe.updated_at.isoformat(),
+            get_cache_version(RECIPE_REPR_CACHE),
+            request.build_absolute_uri('/'),
+            author.username,
+            author.email,
+            author.first_name,
+            author.last_name,
+            author.avatar.name,
+            author.avatar_variants.get('source'),
+            recipe.image_variants.get('source'),
+            recipe.is_favorited,
+            recipe.is_in_shopping_cart,
+            is_subscribed,
+        )
+        return conditional_response(
+            request,
+            etag,
+            lambda: Response(self.get_serializer(recipe).data),
+        )
+
     def get_serializer_class(self):
         """Получение сериализатора в зависимости от действия."""
         if self.request.method in permissions.SAFE_METHODS:
@@ -193,6 +337,7 @@ class RecipeViewSet(viewsets.ModelViewSet):
     ):
         """Общий метод для добавления и удаления рецепта."""
         recipe = get_object_or_404(Recipe, pk=pk)
+        relations = get_viewer_relations(request)
 
         if request.method == 'POST':
             serializer = serializer_class(
@@ -200,15 +345,21 @@ class RecipeViewSet(viewsets.ModelViewSet):
                 context={'request': request}
             )
             serializer.is_valid(raise_exception=True)
-            serializer.save(author=request.user)
+            with transaction.atomic():
+                serializer.save(author=request.user)
+            relations.add(serializer_class.relation, recipe.id)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
 
-        item = model_class.objects.filter(author=request.user, recipe=recipe)
-        if not item.exists():
+        if not relations.contains(serializer_class.relation, recipe.id):
             return Response({'errors': error_message},
                             status=status.HTTP_400_BAD_REQUEST
                             )
-        item.delete()
+        with transaction.atomic():
+            model_class.objects.filter(
+                author=request.user,
+                recipe=recipe
+            ).delete()
+        relations.remove(serializer_class.relation, recipe.id)
         return Response(status=status.HTTP_204_NO_CONTENT)
 
     @action(
@@ -243,6 +394,83 @@ class RecipeViewSet(viewsets.ModelViewSet):
             error_message='Рецепт не найден в избранном.'
         )
 
+    def handle_batch(self, request, model_class, relation):
+        """
+        Пакетное добавление или удаление рецептов.
+
+        Рецепты проверяются одним запросом, изменения применяются одним
+        `INSERT ... ON CONFLICT DO NOTHING` или одним `DELETE`. Для
+        каждого `id` возвращается результат.
+        """
+        serializer = RecipeBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        recipe_ids = list(dict.fromkeys(serializer.validated_data['recipes']))
+        existing = set(
+            Recipe.objects.filter(
+                id__in=recipe_ids
+            ).values_list('id', flat=True)
+        )
+        relations = get_viewer_relations(request)
+        current = set(relations.ids(relation))
+        results = {}
+        for recipe_id in recipe_ids:
+            if recipe_id not in existing:
+                results[recipe_id] = BATCH_NOT_FOUND
+            elif request.method == 'POST':
+                results[recipe_id] = (
+                    BATCH_ALREADY_ADDED if recipe_id in current
+                    else BATCH_ADDED
+                )
+            else:
+                results[recipe_id] = (
+                    BATCH_REMOVED if recipe_id in current
+                    else BATCH_NOT_ADDED
+                )
+        changed = [
+            recipe_id for recipe_id, result in results.items()
+            if result in (BATCH_ADDED, BATCH_REMOVED)
+        ]
+        if changed:
+            with transaction.atomic():
+                if request.method == 'POST':
+                    model_class.add_recipes(request.user, changed)
+                else:
+                    model_class.remove_recipes(request.user, changed)
+            for recipe_id in changed:
+                if request.method == 'POST':
+                    relations.add(relation, recipe_id)
+                else:
+                    relations.remove(relation, recipe_id)
+            bump_cache_version_on_commit(
+                user_namespace(RECIPE_COUNT_CACHE, request.user.id)
+            )
+        return Response({
+            'results': [
+                {'id': recipe_id, 'status': result}
+                for recipe_id, result in results.items()
+            ]
+        })
+
+    @action(
+        methods=['post', 'delete'],
+        detail=False,
+        permission_classes=[IsAuthenticated],
+        url_path='shopping_cart/batch',
+    )
+    def shopping_cart_batch(self, request):
+        """Пакетное добавление или удаление рецептов из корзины."""
+        return self.handle_batch(request, ShoppingCart, SHOPPING_CART)
+
+    @action(
+        methods=['post', 'delete'],
+        detail=False,
+        permission_classes=[IsAuthenticated],
+        url_path='favorite/batch',
+    )
+    def favorite_batch(self, request):
+        """Пакетное добавление или удаление рецептов из избранного."""
+        return self.handle_batch(request, FavoriteRecipe, FAVORITES)
+
     @action(
         detail=False,
         methods=['get'],
@@ -250,20 +478,44 @@ class RecipeViewSet(viewsets.ModelViewSet):
         url_path='download_shopping_cart',
     )
     def download_shopping_cart(self, request):
-        """Скачивание списка покупок в формате PDF."""
-        recipes = Recipe.objects.filter(
-            shopping_cart__author=request.user
-        )
-        shopping_list = ingredients_list(recipes)
-        buffer = pdf_shopping_list(shopping_list, request.user)
-        response = FileResponse(
-            buffer,
-            content_type='application/pdf'
+        """
+        Скачивание списка покупок в формате PDF.
+
+        Документ берётся из кэша по версии списка покупок и отдаётся
+        частями, на повторный запрос с тем же `ETag` отдаётся 304.
+        """
+        user_id = request.user.id
+        version = shopping_list_documents.version(user_id)
+
+        def get_response():
+            response = FileResponse(
+                BytesIO(shopping_list_documents.get(user_id, version)),
+                content_type='application/pdf'
+            )
+            response['Content-Disposition'] = (
+                'attachment; filename="shopping_list.pdf"'
+            )
+            return response
+
+        return conditional_response(
+            request,
+            make_etag(SHOPPING_LIST_CACHE, user_id, *version),
+            get_response,
         )
-        response['Content-Disposition'] = (
-            'attachment; filename="shopping_list.pdf"'
+
+    @action(
+        detail=False,
+        methods=['get'],
+        permission_classes=[IsAuthenticated],
+        url_path='shopping_list',
+    )
+    def shopping_list(self, request):
+        """Список покупок в формате JSON."""
+        serializer = ShoppingListSerializer(
+            request.user.shopping_list.select_related('ingredient'),
+            many=True
         )
-        return response
+        return Response(serializer.data)
 
     @action(
         methods=['get'],
@@ -277,8 +529,6 @@ class RecipeViewSet(viewsets.ModelViewSet):
         original_url = request.build_absolute_uri(
             reverse('api:recipes-detail', args=[recipe.id])
         )
-        link, created = LinkMapped.objects.get_or_create(
-            original_url=original_url
-        )
+        link, _ = LinkMapped.get_or_create_for_url(original_url)
         serializer = ShortLinkSerializer(link, context={'request': request})
         return Response(serializer.data, status=status.HTTP_200_OK)
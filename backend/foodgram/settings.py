@@ -39,12 +39,16 @@ INSTALLED_APPS = [
     'shortener.apps.ShortenerConfig',
 ]
 
+if not USE_SQLITE:
+    INSTALLED_APPS.append('django.contrib.postgres')
+
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'api.relations.ViewerRelationsMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -90,6 +94,20 @@ else:
         }
     }
 
+# Версии пространств имён, представления рецептов, счётчики кэша и
+# короткие ссылки должны быть общими для всех процессов, поэтому в
+# развёртывании нужен общий кэш (memcached из docker-compose).
+# LocMemCache у каждого процесса свой и годится только для разработки.
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
+    }
+}
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -148,3 +166,67 @@ DJOSER = {
 }
 
 FORBIDDEN_USERNAMES = ['me']
+
+PAGINATION_COUNT_CACHE_TIMEOUT = int(
+    os.getenv('PAGINATION_COUNT_CACHE_TIMEOUT', 30)
+)
+
+PAGINATION_COUNT_ESTIMATE = os.getenv(
+    'PAGINATION_COUNT_ESTIMATE', 'False'
+).lower() in ('true', '1')
+
+PAGINATION_COUNT_ESTIMATE_MIN = int(
+    os.getenv('PAGINATION_COUNT_ESTIMATE_MIN', 10_000)
+)
+
+RECIPE_CACHE_TIMEOUT = int(os.getenv('RECIPE_CACHE_TIMEOUT', 60 * 60))
+
+TAG_CACHE_TIMEOUT = int(os.getenv('TAG_CACHE_TIMEOUT', 60 * 60))
+
+IMAGE_VARIANT_WORKERS = int(os.getenv('IMAGE_VARIANT_WORKERS', 2))
+
+IMAGE_VARIANT_FORMAT = os.getenv('IMAGE_VARIANT_FORMAT', 'WEBP').upper()
+
+IMAGE_VARIANT_QUALITY = int(os.getenv('IMAGE_VARIANT_QUALITY', 80))
+
+SHOPPING_LIST_PDF_CACHE_TIMEOUT = int(
+    os.getenv('SHOPPING_LIST_PDF_CACHE_TIMEOUT', 24 * 60 * 60)
+)
+
+SHOPPING_LIST_PDF_WORKERS = int(os.getenv('SHOPPING_LIST_PDF_WORKERS', 1))
+
+IMAGE_UPLOAD_MAX_SIZE = int(
+    os.getenv('IMAGE_UPLOAD_MAX_SIZE', 10 * 1024 * 1024)
+)
+
+INGREDIENT_INDEX_MAX_AGE = int(os.getenv('INGREDIENT_INDEX_MAX_AGE', 5 * 60))
+
+INGREDIENT_SEARCH_MAX_LIMIT = int(
+    os.getenv('INGREDIENT_SEARCH_MAX_LIMIT', 100)
+)
+
+INGREDIENT_SEARCH_TARGET_MS = float(
+    os.getenv('INGREDIENT_SEARCH_TARGET_MS', 20)
+)
+
+SHORT_LINK_CACHE_ENABLED = os.getenv(
+    'SHORT_LINK_CACHE_ENABLED', 'True'
+).lower() in ('true', '1')
+
+SHORT_LINK_CACHE_SIZE = int(os.getenv('SHORT_LINK_CACHE_SIZE', 10_000))
+
+SHORT_LINK_CACHE_TIMEOUT = int(
+    os.getenv('SHORT_LINK_CACHE_TIMEOUT', 24 * 60 * 60)
+)
+
+SHORT_LINK_NEGATIVE_TIMEOUT = int(
+    os.getenv('SHORT_LINK_NEGATIVE_TIMEOUT', 60)
+)
+
+SHORT_LINK_CLICKS_ENABLED = os.getenv(
+    'SHORT_LINK_CLICKS_ENABLED', 'True'
+).lower() in ('true', '1')
+
+SHORT_LINK_CLICKS_FLUSH_INTERVAL = int(
+    os.getenv('SHORT_LINK_CLICKS_FLUSH_INTERVAL', 30)
+)
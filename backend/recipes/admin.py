@@ -16,6 +16,7 @@ from recipes.models import (
     Recipe,
     RecipeIngredient,
     ShoppingCart,
+    ShoppingListIngredient,
     Tag,
 )
 
@@ -56,6 +57,10 @@ class RecipeAdmin(admin.ModelAdmin):
         ),
     )
 
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        ShoppingListIngredient.rebuild_for_recipe(form.instance)
+
     def favorite_recipe(self, obj):
         """Избранное."""
         return obj.favorite_recipes.count()
@@ -120,6 +125,15 @@ class AuthorRecipeAdmin(admin.ModelAdmin):
     list_display_links = ('id', '__str__')
 
 
+@admin.register(ShoppingListIngredient)
+class ShoppingListIngredientAdmin(admin.ModelAdmin):
+    """Список покупок."""
+
+    list_display = ('author', 'ingredient', 'amount')
+    list_select_related = ('author', 'ingredient')
+    search_fields = ('author__username',)
+
+
 @admin.register(Import)
 class BookImportAdmin(admin.ModelAdmin):
     """Импорт CSV файлов."""
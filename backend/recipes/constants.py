@@ -6,3 +6,7 @@ INGREDIENT_UNIT_MAX = 64
 RECIPE_CHAR_MAX = 256
 TAG_CHAR_MAX = 32
 MIN_TIME = 1
+SEARCH_CONFIG = 'russian'
+SEARCH_FTS_TABLE = 'recipes_recipe_fts'
+SEARCH_NAME_WEIGHT = 4.0
+SEARCH_TEXT_WEIGHT = 1.0
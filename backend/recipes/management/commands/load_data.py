@@ -6,7 +6,7 @@ from django.core.management.base import BaseCommand
 from django.conf import settings
 from tqdm import tqdm
 
-from recipes.models import Ingredient, Tag
+from recipes.models import Ingredient, Tag, catalog_changed
 
 CSV_FILES_DIR = settings.CSV_FILES_DIR
 
@@ -35,6 +35,7 @@ def load(csv_file, model, *fields):
             for row in tqdm(reader(rows), desc=f'Загрузка {csv_file}'):
                 objects_to_create.append(model(**dict(zip(fields, row))))
             model.objects.bulk_create(objects_to_create)
+            catalog_changed.send(sender=model)
             logging.info(f'Данные из {csv_file} успешно загружены.')
         except Exception as error:
             logging.error(f'Ошибка {error}! '
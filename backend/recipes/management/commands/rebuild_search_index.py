@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from recipes.search import rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = (
+        'Перестраивает поисковый индекс рецептов на SQLite. '
+        'На PostgreSQL индекс обновляется базой.'
+    )
+
+    def handle(self, *args, **options):
+        rebuild_search_index()
+        self.stdout.write(self.style.SUCCESS('Поисковый индекс перестроен.'))
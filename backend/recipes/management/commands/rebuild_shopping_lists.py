@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes.models import ShoppingListIngredient
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает и проверяет списки покупок пользователей.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify-only',
+            action='store_true',
+            help='Только проверить списки покупок, не пересчитывая их.',
+        )
+
+    def handle(self, *args, **options):
+        if not options['verify_only']:
+            ShoppingListIngredient.rebuild()
+            self.stdout.write('Списки покупок пересчитаны.')
+        mismatched = ShoppingListIngredient.verify()
+        if mismatched:
+            raise CommandError(
+                'Расхождения в списках покупок пользователей: '
+                + ', '.join(map(str, sorted(mismatched)))
+            )
+        self.stdout.write(
+            self.style.SUCCESS('Списки покупок совпадают с корзинами.')
+        )
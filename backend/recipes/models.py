@@ -1,6 +1,9 @@
 from django.core.validators import MaxValueValidator, MinValueValidator
 from django.contrib.auth import get_user_model
-from django.db import models
+from django.db import connection, models, transaction
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import RowNumber
+from django.dispatch import Signal
 
 from recipes.constants import (
     AMOUNT_MAX,
@@ -11,9 +14,18 @@ from recipes.constants import (
     RECIPE_CHAR_MAX,
     TAG_CHAR_MAX,
 )
+from recipes.search import search_expressions, search_terms
 
 User = get_user_model()
 
+# Отправляется после изменения списков покупок пользователей `authors`
+# (список id или None для всех пользователей).
+shopping_list_changed = Signal()
+
+# Отправляется после массовой загрузки справочника `sender` (тегов или
+# ингредиентов) в обход `post_save`.
+catalog_changed = Signal()
+
 
 class AuthorModel(models.Model):
     """Автор."""
@@ -87,6 +99,111 @@ class Ingredient(models.Model):
         return f'{self.name} ({self.measurement_unit})'
 
 
+class RecipeQuerySet(models.QuerySet):
+    """Запросы к рецептам."""
+
+    def with_user_flags(self, user):
+        """
+        Аннотирует рецепты флагами избранного и корзины пользователя.
+
+        Флаги вычисляются подзапросами EXISTS в том же запросе, что и
+        выборка рецептов, поэтому не требуют отдельного запроса на строку.
+        """
+        if not user.is_authenticated:
+            return self.annotate(
+                is_favorited=models.Value(
+                    False,
+                    output_field=models.BooleanField(),
+                ),
+                is_in_shopping_cart=models.Value(
+                    False,
+                    output_field=models.BooleanField(),
+                ),
+            )
+        return self.annotate(
+            is_favorited=models.Exists(
+                FavoriteRecipe.objects.filter(
+                    author=user,
+                    recipe=models.OuterRef('pk'),
+                )
+            ),
+            is_in_shopping_cart=models.Exists(
+                ShoppingCart.objects.filter(
+                    author=user,
+                    recipe=models.OuterRef('pk'),
+                )
+            ),
+        )
+
+    def for_reading(self, user):
+        """
+        Рецепты для отображения пользователю.
+
+        Присоединяет автора. Теги и ингредиенты предзагружаются по
+        `content_lookups` только для рецептов, которых нет в кэше
+        представлений.
+        """
+        return self.with_user_flags(user).select_related('author')
+
+    def latest_by_author(self, author_ids, limit=None):
+        """
+        Рецепты авторов `author_ids`, не более `limit` последних у каждого.
+
+        Ограничение применяется в базе через `ROW_NUMBER()` с разбиением
+        по автору, поэтому лишние рецепты не загружаются.
+        """
+        recipes = self.filter(author_id__in=author_ids)
+        if limit is None:
+            return recipes
+        sql, params = Recipe.objects.filter(
+            author_id__in=author_ids
+        ).annotate(
+            author_position=models.Window(
+                expression=RowNumber(),
+                partition_by=[models.F('author_id')],
+                order_by=[
+                    models.F('created_at').desc(),
+                    models.F('id').desc(),
+                ],
+            )
+        ).values('id', 'author_position').query.sql_with_params()
+        return recipes.filter(
+            id__in=RawSQL(
+                f'SELECT ranked.id FROM ({sql}) ranked '
+                'WHERE ranked.author_position <= %s',
+                (*params, limit),
+            )
+        )
+
+    def search(self, query):
+        """
+        Рецепты, в названии или описании которых есть слова `query`.
+
+        Отбор идёт по полнотекстовому индексу, рецепты упорядочены
+        по рангу совпадения, затем по обычному порядку.
+        """
+        terms = search_terms(query)
+        if not terms:
+            return self.none()
+        condition, rank = search_expressions(self, terms)
+        return self.filter(condition).annotate(
+            search_rank=rank
+        ).order_by('-search_rank', *self.model._meta.ordering)
+
+    @staticmethod
+    def content_lookups():
+        """Предзагрузка тегов и ингредиентов рецепта."""
+        return (
+            'tags',
+            models.Prefetch(
+                'recipe_ingredients',
+                queryset=RecipeIngredient.objects.select_related(
+                    'ingredient'
+                ),
+            ),
+        )
+
+
 class Recipe(AuthorModel):
     """Рецепты."""
 
@@ -94,6 +211,12 @@ class Recipe(AuthorModel):
         'Картинка',
         upload_to='recipes/',
     )
+    image_variants = models.JSONField(
+        'Варианты картинки',
+        default=dict,
+        blank=True,
+        editable=False,
+    )
     name = models.CharField(
         'Название',
         max_length=RECIPE_CHAR_MAX,
@@ -105,6 +228,10 @@ class Recipe(AuthorModel):
         'Создано',
         auto_now_add=True,
     )
+    updated_at = models.DateTimeField(
+        'Изменено',
+        auto_now=True,
+    )
     tags = models.ManyToManyField(
         Tag,
         verbose_name='Теги',
@@ -121,9 +248,17 @@ class Recipe(AuthorModel):
         ],
     )
 
+    objects = RecipeQuerySet.as_manager()
+
     class Meta:
-        ordering = ('-created_at',)
+        ordering = ('-created_at', '-id')
         default_related_name = 'recipes'
+        indexes = [
+            models.Index(
+                fields=['-created_at', '-id'],
+                name='recipe_created_at_id_idx',
+            ),
+        ]
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
 
@@ -185,6 +320,52 @@ class AuthorRecipeModel(AuthorModel):
         abstract = True
         ordering = ('-created_at',)
 
+    @classmethod
+    def add_recipes(cls, author, recipe_ids):
+        """
+        Добавляет рецепты `recipe_ids` одним `INSERT`.
+
+        Уже добавленные рецепты пропускаются через `ON CONFLICT DO
+        NOTHING`. Сигналы `post_save` не отправляются.
+        """
+        cls.objects.bulk_create(
+            [
+                cls(author=author, recipe_id=recipe_id)
+                for recipe_id in recipe_ids
+            ],
+            ignore_conflicts=True,
+        )
+
+    @classmethod
+    def remove_recipes(cls, author, recipe_ids):
+        """
+        Удаляет рецепты `recipe_ids` одним `DELETE` и возвращает их число.
+
+        Запрос выполняется напрямую, чтобы не отправлять `pre_delete`
+        и `post_delete` на каждую строку: каскадов у таблицы нет,
+        а производные данные пересчитывает вызывающий код.
+        """
+        recipe_ids = list(recipe_ids)
+        if not recipe_ids:
+            return 0
+        opts = cls._meta
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'DELETE FROM {table} WHERE {author} = %s '
+                'AND {recipe} IN ({ids})'.format(
+                    table=connection.ops.quote_name(opts.db_table),
+                    author=connection.ops.quote_name(
+                        opts.get_field('author').column
+                    ),
+                    recipe=connection.ops.quote_name(
+                        opts.get_field('recipe').column
+                    ),
+                    ids=', '.join(['%s'] * len(recipe_ids)),
+                ),
+                [author.id, *recipe_ids],
+            )
+            return cursor.rowcount
+
 
 class FavoriteRecipe(AuthorRecipeModel):
     """Избранное."""
@@ -221,6 +402,174 @@ class ShoppingCart(AuthorRecipeModel):
     def __str__(self):
         return f"{self.recipe.name!r} в корзине у {self.author.username!r}"
 
+    @classmethod
+    def add_recipes(cls, author, recipe_ids):
+        """Добавляет рецепты и пересчитывает список покупок автора."""
+        with transaction.atomic():
+            super().add_recipes(author, recipe_ids)
+            ShoppingListIngredient.rebuild([author.id])
+
+    @classmethod
+    def remove_recipes(cls, author, recipe_ids):
+        """Удаляет рецепты и пересчитывает список покупок автора."""
+        with transaction.atomic():
+            deleted = super().remove_recipes(author, recipe_ids)
+            ShoppingListIngredient.rebuild([author.id])
+        return deleted
+
+
+class ShoppingListIngredient(models.Model):
+    """
+    Список покупок пользователя.
+
+    Материализованная сумма ингредиентов рецептов из корзины. Изменяется
+    вместе с корзиной и пересчитывается при изменении рецептов в ней.
+    """
+
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        verbose_name='Автор',
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        verbose_name='Ингредиент',
+    )
+    amount = models.PositiveIntegerField(
+        'Количество',
+    )
+
+    class Meta:
+        ordering = ('ingredient__name', 'ingredient__measurement_unit')
+        default_related_name = 'shopping_list'
+        verbose_name = 'Список покупок'
+        verbose_name_plural = 'Списки покупок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['author', 'ingredient'],
+                name='unique_shopping_list_ingredient',
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.ingredient} - {self.amount} у {self.author}'
+
+    @classmethod
+    def add_recipe(cls, author_id, recipe_id, sign=1):
+        """
+        Добавляет ингредиенты рецепта в список покупок пользователя.
+
+        С `sign=-1` вычитает их, удаляя строки с нулевым количеством.
+        """
+        amounts = dict(
+            RecipeIngredient.objects.filter(
+                recipe_id=recipe_id
+            ).values_list('ingredient_id', 'amount')
+        )
+        if not amounts:
+            return
+        with transaction.atomic():
+            items = {
+                item.ingredient_id: item
+                for item in cls.objects.select_for_update().filter(
+                    author_id=author_id,
+                    ingredient_id__in=amounts,
+                )
+            }
+            created, updated, deleted = [], [], []
+            for ingredient_id, amount in amounts.items():
+                item = items.get(ingredient_id)
+                if item is None:
+                    if sign > 0:
+                        created.append(cls(
+                            author_id=author_id,
+                            ingredient_id=ingredient_id,
+                            amount=amount,
+                        ))
+                    continue
+                item.amount += sign * amount
+                if item.amount > 0:
+                    updated.append(item)
+                else:
+                    deleted.append(item.id)
+            cls.objects.bulk_create(created)
+            cls.objects.bulk_update(updated, ['amount'])
+            if deleted:
+                cls.objects.filter(id__in=deleted).delete()
+        shopping_list_changed.send(sender=cls, authors=[author_id])
+
+    @classmethod
+    def remove_recipe(cls, author_id, recipe_id):
+        """Вычитает ингредиенты рецепта из списка покупок пользователя."""
+        cls.add_recipe(author_id, recipe_id, sign=-1)
+
+    @classmethod
+    def calculate(cls, authors=None):
+        """
+        Суммы ингредиентов по корзинам одним запросом с группировкой.
+
+        Возвращает строки `(author_id, ingredient_id, amount)` для
+        пользователей `authors` (id или подзапрос) или для всех.
+        """
+        if authors is None:
+            rows = RecipeIngredient.objects.filter(
+                recipe__shopping_cart__isnull=False
+            )
+        else:
+            rows = RecipeIngredient.objects.filter(
+                recipe__shopping_cart__author__in=authors
+            )
+        return rows.values(
+            'recipe__shopping_cart__author',
+            'ingredient',
+        ).annotate(
+            total_amount=models.Sum('amount')
+        ).order_by().values_list(
+            'recipe__shopping_cart__author',
+            'ingredient',
+            'total_amount',
+        )
+
+    @classmethod
+    def rebuild(cls, authors=None):
+        """Пересчитывает списки покупок пользователей `authors` или всех."""
+        with transaction.atomic():
+            items = cls.objects.all()
+            if authors is not None:
+                items = items.filter(author__in=authors)
+            items.delete()
+            cls.objects.bulk_create(
+                cls(
+                    author_id=author_id,
+                    ingredient_id=ingredient_id,
+                    amount=amount,
+                )
+                for author_id, ingredient_id, amount
+                in cls.calculate(authors)
+            )
+        shopping_list_changed.send(sender=cls, authors=authors)
+
+    @classmethod
+    def rebuild_for_recipe(cls, recipe):
+        """Пересчитывает списки покупок пользователей с рецептом в корзине."""
+        authors = list(
+            ShoppingCart.objects.filter(
+                recipe=recipe
+            ).values_list('author_id', flat=True)
+        )
+        if authors:
+            cls.rebuild(authors)
+
+    @classmethod
+    def verify(cls):
+        """Возвращает `id` пользователей с расхождением в списке покупок."""
+        expected = set(cls.calculate())
+        actual = set(
+            cls.objects.values_list('author_id', 'ingredient_id', 'amount')
+        )
+        return {row[0] for row in expected ^ actual}
+
 
 class Import(models.Model):
     """Импорт CSV."""
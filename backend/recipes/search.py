@@ -0,0 +1,106 @@
+import re
+
+from django.db import connections
+from django.db.models import FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+
+from recipes.constants import (
+    SEARCH_CONFIG,
+    SEARCH_FTS_TABLE,
+    SEARCH_NAME_WEIGHT,
+    SEARCH_TEXT_WEIGHT,
+)
+
+
+def search_terms(query):
+    """Слова запроса без символов синтаксиса полнотекстового поиска."""
+    return re.findall(r'\w+', query.lower())
+
+
+def search_expressions(queryset, terms):
+    """
+    Условие отбора и выражение ранга для поиска по `terms`.
+
+    На PostgreSQL ищет по сгенерированному столбцу `search_vector`
+    с GIN-индексом, на SQLite — по таблице FTS5 `SEARCH_FTS_TABLE`.
+    Каждое слово ищется как префикс, все слова обязательны.
+    """
+    table = queryset.model._meta.db_table
+    vendor = connections[queryset.db].vendor
+    if vendor == 'postgresql':
+        tsquery = ' & '.join(f'{term}:*' for term in terms)
+        condition = RawSQL(
+            f'SELECT id FROM {table} '
+            f"WHERE search_vector @@ to_tsquery('{SEARCH_CONFIG}', %s)",
+            [tsquery],
+        )
+        rank = RawSQL(
+            f'ts_rank({table}.search_vector, '
+            f"to_tsquery('{SEARCH_CONFIG}', %s))",
+            [tsquery],
+            output_field=FloatField(),
+        )
+        return Q(id__in=condition), rank
+    if vendor == 'sqlite':
+        match = ' '.join(f'"{term}"*' for term in terms)
+        condition = RawSQL(
+            f'SELECT rowid FROM {SEARCH_FTS_TABLE} '
+            f'WHERE {SEARCH_FTS_TABLE} MATCH %s',
+            [match],
+        )
+        rank = RawSQL(
+            f'SELECT -bm25({SEARCH_FTS_TABLE}, '
+            f'{SEARCH_NAME_WEIGHT}, {SEARCH_TEXT_WEIGHT}) '
+            f'FROM {SEARCH_FTS_TABLE} '
+            f'WHERE {SEARCH_FTS_TABLE} MATCH %s '
+            f'AND rowid = {table}.id',
+            [match],
+            output_field=FloatField(),
+        )
+        return Q(id__in=condition), rank
+    condition = Q()
+    for term in terms:
+        condition &= Q(name__icontains=term) | Q(text__icontains=term)
+    return condition, Value(0.0, output_field=FloatField())
+
+
+def index_recipe(recipe):
+    """Обновляет строку рецепта в таблице FTS5 на SQLite."""
+    connection = connections[recipe._state.db]
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {SEARCH_FTS_TABLE} WHERE rowid = %s',
+            [recipe.id],
+        )
+        cursor.execute(
+            f'INSERT INTO {SEARCH_FTS_TABLE} (rowid, name, text) '
+            'VALUES (%s, %s, %s)',
+            [recipe.id, recipe.name, recipe.text],
+        )
+
+
+def unindex_recipe(recipe):
+    """Удаляет рецепт из таблицы FTS5 на SQLite."""
+    connection = connections[recipe._state.db]
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {SEARCH_FTS_TABLE} WHERE rowid = %s',
+            [recipe.id],
+        )
+
+
+def rebuild_search_index(using='default'):
+    """Заполняет таблицу FTS5 заново на SQLite."""
+    connection = connections[using]
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {SEARCH_FTS_TABLE}')
+        cursor.execute(
+            f'INSERT INTO {SEARCH_FTS_TABLE} (rowid, name, text) '
+            'SELECT id, name, text FROM recipes_recipe'
+        )
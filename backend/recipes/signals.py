@@ -0,0 +1,43 @@
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from recipes.models import Recipe, ShoppingCart, ShoppingListIngredient
+from recipes.search import index_recipe, unindex_recipe
+
+
+@receiver(post_save, sender=ShoppingCart)
+def add_to_shopping_list(sender, instance, created, **kwargs):
+    """Обновляет список покупок при добавлении рецепта в корзину."""
+    if created:
+        ShoppingListIngredient.add_recipe(
+            instance.author_id,
+            instance.recipe_id
+        )
+    else:
+        ShoppingListIngredient.rebuild([instance.author_id])
+
+
+@receiver(pre_delete, sender=ShoppingCart)
+def remove_from_shopping_list(sender, instance, **kwargs):
+    """
+    Обновляет список покупок при удалении рецепта из корзины.
+
+    Вызывается до удаления, чтобы при каскадном удалении рецепта его
+    ингредиенты ещё были доступны.
+    """
+    ShoppingListIngredient.remove_recipe(
+        instance.author_id,
+        instance.recipe_id
+    )
+
+
+@receiver(post_save, sender=Recipe)
+def update_search_index(sender, instance, **kwargs):
+    """Обновляет поисковый индекс рецепта на SQLite."""
+    index_recipe(instance)
+
+
+@receiver(post_delete, sender=Recipe)
+def remove_from_search_index(sender, instance, **kwargs):
+    """Удаляет рецепт из поискового индекса на SQLite."""
+    unindex_recipe(instance)
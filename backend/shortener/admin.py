@@ -1,6 +1,34 @@
 from django.contrib import admin
 
-from .models import LinkMapped
+from .models import LinkClicks, LinkMapped
 
 
-admin.site.register(LinkMapped)
+@admin.register(LinkMapped)
+class LinkMappedAdmin(admin.ModelAdmin):
+    """Ссылка."""
+
+    list_display = ('code', 'original_url', 'clicks', 'last_accessed')
+    list_select_related = ('click_stats',)
+    search_fields = ('url_hash', 'original_url')
+
+    @admin.display(description='Переходы')
+    def clicks(self, obj):
+        stats = getattr(obj, 'click_stats', None)
+        return stats.clicks if stats else 0
+
+    @admin.display(description='Последний переход')
+    def last_accessed(self, obj):
+        stats = getattr(obj, 'click_stats', None)
+        return stats.last_accessed if stats else None
+
+
+@admin.register(LinkClicks)
+class LinkClicksAdmin(admin.ModelAdmin):
+    """Переходы по ссылке."""
+
+    list_display = ('link', 'clicks', 'last_accessed')
+    list_select_related = ('link',)
+    readonly_fields = ('link', 'clicks', 'last_accessed')
+
+    def has_add_permission(self, request):
+        return False
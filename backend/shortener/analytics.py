@@ -0,0 +1,88 @@
+import atexit
+import logging
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections
+from django.utils import timezone
+
+from shortener.models import LinkClicks, LinkMapped
+
+logger = logging.getLogger(__name__)
+
+
+class ClickBuffer:
+    """
+    Буфер переходов по коротким ссылкам.
+
+    Переходы копятся в памяти процесса и раз в
+    `SHORT_LINK_CLICKS_FLUSH_INTERVAL` секунд записываются фоновым
+    потоком в `LinkClicks` одной транзакцией. Буфер забирается целиком
+    до записи и возвращается только при откате транзакции, поэтому
+    каждый переход учитывается не больше одного раза. При штатной
+    остановке процесса буфер сбрасывается через `atexit`.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.clicks = Counter()
+        self.last_accessed = {}
+        self.thread = None
+        atexit.register(self.flush_quietly)
+
+    def record(self, code):
+        if not settings.SHORT_LINK_CLICKS_ENABLED:
+            return
+        with self.lock:
+            self.clicks[code] += 1
+            self.last_accessed[code] = timezone.now()
+            if self.thread is None or not self.thread.is_alive():
+                self.start()
+
+    def start(self):
+        if settings.SHORT_LINK_CLICKS_FLUSH_INTERVAL <= 0:
+            return
+        self.thread = threading.Thread(
+            target=self.run, name='link-clicks-flush', daemon=True
+        )
+        self.thread.start()
+
+    def run(self):
+        while True:
+            time.sleep(settings.SHORT_LINK_CLICKS_FLUSH_INTERVAL)
+            self.flush_quietly()
+            close_old_connections()
+
+    def flush(self):
+        """Записывает накопленные переходы и возвращает их число."""
+        with self.lock:
+            clicks, self.clicks = self.clicks, Counter()
+            last_accessed, self.last_accessed = self.last_accessed, {}
+        if not clicks:
+            return 0
+        try:
+            ids = LinkMapped.ids_by_code(list(clicks))
+            LinkClicks.add({
+                link_id: (clicks[code], last_accessed[code])
+                for code, link_id in ids.items()
+            })
+        except DatabaseError:
+            with self.lock:
+                self.clicks.update(clicks)
+                for code, accessed in last_accessed.items():
+                    self.last_accessed[code] = max(
+                        accessed, self.last_accessed.get(code, accessed)
+                    )
+            raise
+        return sum(clicks[code] for code in ids)
+
+    def flush_quietly(self):
+        try:
+            self.flush()
+        except Exception as e:
+            logger.error(f'Ошибка записи переходов по ссылкам: {str(e)}')
+
+
+click_buffer = ClickBuffer()
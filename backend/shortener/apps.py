@@ -5,3 +5,6 @@ class ShortenerConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'shortener'
     verbose_name = 'Ссылки'
+
+    def ready(self):
+        from shortener import signals  # noqa: F401
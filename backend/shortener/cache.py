@@ -0,0 +1,105 @@
+import threading
+from collections import Counter, OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+
+from api.cache import record_cache_stats
+from shortener.constants import SHORT_LINK_CACHE
+from shortener.models import LinkMapped
+
+MISSING = ''
+
+
+class LinkCache:
+    """
+    Кэш разрешения коротких ссылок.
+
+    Короткие ссылки не меняются после создания, поэтому найденные
+    ссылки хранятся без срока в ограниченном LRU-кэше процесса и в общем
+    кэше Django. Неизвестные хэши кэшируются на
+    `SHORT_LINK_NEGATIVE_TIMEOUT`, чтобы перебор хэшей не нагружал базу,
+    но только в общем кэше: коды идут подряд, и отрицательная запись
+    в памяти другого процесса, которую `forget` не сбросит, скрыла бы
+    только что созданную ссылку.
+
+    Попадания и промахи считаются в общих счётчиках `record_cache_stats`
+    (команда `cache_stats`), а `stats` процесса различает попадания
+    в память процесса и в общий кэш.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.items = OrderedDict()
+        self.stats = Counter()
+
+    @staticmethod
+    def cache_key(url_hash):
+        return f'{SHORT_LINK_CACHE}:{url_hash}'
+
+    def get_local(self, url_hash):
+        with self.lock:
+            item = self.items.get(url_hash)
+            if item is None:
+                return None
+            self.items.move_to_end(url_hash)
+            return item
+
+    def set_local(self, url_hash, original_url):
+        with self.lock:
+            self.items[url_hash] = original_url
+            self.items.move_to_end(url_hash)
+            while len(self.items) > settings.SHORT_LINK_CACHE_SIZE:
+                self.items.popitem(last=False)
+
+    def resolve(self, url_hash):
+        """Возвращает оригинальную ссылку по хэшу или `None`."""
+        if not LinkMapped.is_valid_code(url_hash):
+            self.stats['invalid'] += 1
+            return None
+        if not settings.SHORT_LINK_CACHE_ENABLED:
+            self.stats['db'] += 1
+            return self.load(url_hash)
+        original_url = self.get_local(url_hash)
+        if original_url is not None:
+            self.stats['local_hits'] += 1
+            record_cache_stats(SHORT_LINK_CACHE, hits=1)
+            return original_url
+        original_url = cache.get(self.cache_key(url_hash))
+        if original_url is not None:
+            self.stats['shared_hits'] += 1
+            record_cache_stats(SHORT_LINK_CACHE, hits=1)
+        else:
+            self.stats['misses'] += 1
+            record_cache_stats(SHORT_LINK_CACHE, misses=1)
+            original_url = self.load(url_hash) or MISSING
+            cache.set(
+                self.cache_key(url_hash),
+                original_url,
+                settings.SHORT_LINK_NEGATIVE_TIMEOUT
+                if original_url == MISSING
+                else settings.SHORT_LINK_CACHE_TIMEOUT
+            )
+        if original_url == MISSING:
+            return None
+        self.set_local(url_hash, original_url)
+        return original_url
+
+    @staticmethod
+    def load(url_hash):
+        return LinkMapped.filter_by_code(
+            url_hash
+        ).values_list('original_url', flat=True).first()
+
+    def forget(self, url_hash):
+        """Удаляет хэш из кэшей, например после создания ссылки."""
+        cache.delete(self.cache_key(url_hash))
+        with self.lock:
+            self.items.pop(url_hash, None)
+
+    def clear(self):
+        with self.lock:
+            self.items.clear()
+
+
+link_cache = LinkCache()
@@ -2,3 +2,7 @@ MIN = 8
 MAX = 10
 MAX_HASH = 15
 URL = 256
+DIGEST = 64
+ALPHABET = '0123456789abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ'
+CLICKS_FLUSH_BATCH = 500
+SHORT_LINK_CACHE = 'shortener:link'
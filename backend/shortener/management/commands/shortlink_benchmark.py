@@ -0,0 +1,62 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import RequestFactory, override_settings
+
+from shortener.cache import link_cache
+from shortener.models import LinkMapped
+from shortener.views import load_url
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет число перенаправлений по коротким ссылкам в секунду '
+        'с кэшем и без него. Тестовые ссылки создаются в откатываемой '
+        'транзакции.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--links', type=int, default=1000)
+        parser.add_argument('--requests', type=int, default=20_000)
+        parser.add_argument(
+            '--unknown',
+            type=float,
+            default=0.1,
+            help='Доля запросов с несуществующими хэшами.',
+        )
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        factory = RequestFactory()
+        with transaction.atomic():
+            hashes = [
+                LinkMapped.get_or_create_for_url(
+                    f'http://localhost/api/recipes/{index}/'
+                )[0].code
+                for index in range(options['links'])
+            ]
+            unknown = [f'missing{index}' for index in range(100)]
+            requests = [
+                rng.choice(
+                    unknown if rng.random() < options['unknown'] else hashes
+                )
+                for _ in range(options['requests'])
+            ]
+            for enabled in (False, True):
+                with override_settings(SHORT_LINK_CACHE_ENABLED=enabled):
+                    link_cache.stats.clear()
+                    started = time.perf_counter()
+                    for url_hash in requests:
+                        load_url(factory.get(f'/s/{url_hash}/'), url_hash)
+                    elapsed = time.perf_counter() - started
+                self.stdout.write(
+                    f'cache={"on" if enabled else "off"} '
+                    f'{len(requests) / elapsed:.0f} req/s '
+                    f'stats={dict(link_cache.stats)}'
+                )
+            for url_hash in hashes + unknown:
+                link_cache.forget(url_hash)
+            transaction.set_rollback(True)
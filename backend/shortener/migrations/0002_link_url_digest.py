@@ -0,0 +1,40 @@
+# Generated by Django 3.2.3 on 2026-10-18 06:13
+
+import hashlib
+
+from django.db import migrations, models
+
+
+def fill_url_digests(apps, schema_editor):
+    LinkMapped = apps.get_model('shortener', 'LinkMapped')
+    seen = set()
+    links = []
+    for link in LinkMapped.objects.order_by('id').iterator():
+        digest = hashlib.sha256(link.original_url.encode()).hexdigest()
+        if digest in seen:
+            continue
+        seen.add(digest)
+        link.url_digest = digest
+        links.append(link)
+    LinkMapped.objects.bulk_update(links, ['url_digest'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shortener', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='linkmapped',
+            name='url_digest',
+            field=models.CharField(blank=True, editable=False, max_length=64, null=True, unique=True, verbose_name='Хэш оригинальной ссылки'),
+        ),
+        migrations.AlterField(
+            model_name='linkmapped',
+            name='url_hash',
+            field=models.CharField(blank=True, max_length=15, null=True, unique=True, verbose_name='Короткая ссылка'),
+        ),
+        migrations.RunPython(fill_url_digests, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 3.2.3 on 2026-10-18 06:16
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shortener', '0002_link_url_digest'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LinkClicks',
+            fields=[
+                ('link', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='click_stats', serialize=False, to='shortener.linkmapped', verbose_name='Ссылка')),
+                ('clicks', models.PositiveBigIntegerField(default=0, verbose_name='Переходы')),
+                ('last_accessed', models.DateTimeField(verbose_name='Последний переход')),
+            ],
+            options={
+                'verbose_name': 'Переходы по ссылке',
+                'verbose_name_plural': 'Переходы по ссылкам',
+                'ordering': ('-clicks',),
+            },
+        ),
+    ]
@@ -1,9 +1,16 @@
+import hashlib
 import string
 from random import choice, randint
 
-from django.db import models
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, models, transaction
+from django.db.models import Case, F, PositiveBigIntegerField, Value, When
+from django.db.models.functions import Greatest
 
 from shortener.constants import (
+    ALPHABET,
+    CLICKS_FLUSH_BATCH,
+    DIGEST,
     MAX,
     MAX_HASH,
     MIN,
@@ -20,23 +27,218 @@ def generate_hash() -> str:
     )
 
 
+def encode_id(value: int) -> str:
+    """Кодирует `id` в base62."""
+    code = ''
+    while True:
+        value, index = divmod(value, len(ALPHABET))
+        code = ALPHABET[index] + code
+        if not value:
+            return code
+
+
+def decode_id(code: str):
+    """
+    Декодирует base62 в `id` или возвращает `None`.
+
+    Код принимается только в каноническом виде, как его выдаёт
+    `encode_id`, иначе `1`, `01` и `001` вели бы на одну ссылку.
+    """
+    value = 0
+    for char in code:
+        index = ALPHABET.find(char)
+        if index < 0:
+            return None
+        value = value * len(ALPHABET) + index
+    if encode_id(value) != code:
+        return None
+    return value
+
+
+def url_digest(url: str) -> str:
+    return hashlib.sha256(url.encode()).hexdigest()
+
+
 class LinkMapped(models.Model):
-    """Ссылки."""
+    """
+    Ссылки.
+
+    Новые ссылки не хранят хэш: код — это `id` в base62, поэтому коды
+    не пересекаются и короче `MIN` символов. Хэши старых ссылок имеют
+    длину от `MIN` символов и ищутся по `url_hash`.
+    """
 
     url_hash = models.CharField(
         'Короткая ссылка',
         max_length=MAX_HASH,
-        default=generate_hash,
-        unique=True
+        unique=True,
+        blank=True,
+        null=True,
     )
     original_url = models.URLField(
         'Оригинальная ссылка',
         max_length=URL
     )
+    url_digest = models.CharField(
+        'Хэш оригинальной ссылки',
+        max_length=DIGEST,
+        unique=True,
+        blank=True,
+        null=True,
+        editable=False,
+    )
 
     class Meta:
         verbose_name = 'Ссылка'
         verbose_name_plural = 'Ссылки'
 
     def __str__(self):
-        return f'{self.original_url} -> {self.url_hash}'
+        return f'{self.original_url} -> {self.code}'
+
+    def clean(self):
+        if self.original_url and self.__class__.objects.filter(
+            url_digest=url_digest(self.original_url)
+        ).exclude(pk=self.pk).exists():
+            raise ValidationError(
+                {'original_url': 'Для этой ссылки уже есть короткая.'}
+            )
+
+    def save(self, *args, **kwargs):
+        """Сохраняет ссылку, пересчитывая хэш оригинальной ссылки."""
+        self.url_digest = url_digest(self.original_url)
+        super().save(*args, **kwargs)
+
+    @property
+    def code(self) -> str:
+        return self.url_hash or encode_id(self.id)
+
+    @staticmethod
+    def is_valid_code(code):
+        """Может ли `code` быть кодом ссылки, без запроса к базе."""
+        if len(code) >= MIN:
+            return len(code) <= MAX_HASH and all(
+                char in ALPHABET for char in code
+            )
+        return decode_id(code) is not None
+
+    @classmethod
+    def filter_by_code(cls, code):
+        """Ссылки с кодом `code`: по `id` для новых, по хэшу для старых."""
+        if len(code) >= MIN:
+            return cls.objects.filter(url_hash=code)
+        link_id = decode_id(code)
+        if link_id is None:
+            return cls.objects.none()
+        return cls.objects.filter(id=link_id, url_hash__isnull=True)
+
+    @classmethod
+    def ids_by_code(cls, codes):
+        """Словарь `код: id` для существующих ссылок из `codes`."""
+        hashes = [code for code in codes if len(code) >= MIN]
+        decoded = {
+            decode_id(code): code for code in codes if len(code) < MIN
+        }
+        decoded.pop(None, None)
+        ids = dict(
+            cls.objects.filter(url_hash__in=hashes).values_list(
+                'url_hash', 'id'
+            )
+        )
+        ids.update(
+            (decoded[link_id], link_id)
+            for link_id in cls.objects.filter(
+                id__in=decoded, url_hash__isnull=True
+            ).values_list('id', flat=True)
+        )
+        return ids
+
+    @classmethod
+    def get_or_create_for_url(cls, original_url):
+        """
+        Возвращает ссылку для `original_url`, создавая её при отсутствии.
+
+        Ищет по индексу хэша оригинальной ссылки и при промахе вставляет
+        строку в точке сохранения. Если одновременный запрос успел
+        создать ту же ссылку, уникальный хэш даёт `IntegrityError`,
+        и возвращается созданная им ссылка.
+        """
+        digest = url_digest(original_url)
+        link = cls.objects.filter(url_digest=digest).first()
+        if link is not None:
+            return link, False
+        try:
+            with transaction.atomic():
+                return cls.objects.create(original_url=original_url), True
+        except IntegrityError:
+            return cls.objects.get(url_digest=digest), False
+
+
+class LinkClicks(models.Model):
+    """Переходы по ссылке."""
+
+    link = models.OneToOneField(
+        LinkMapped,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='click_stats',
+        verbose_name='Ссылка',
+    )
+    clicks = models.PositiveBigIntegerField('Переходы', default=0)
+    last_accessed = models.DateTimeField('Последний переход')
+
+    class Meta:
+        verbose_name = 'Переходы по ссылке'
+        verbose_name_plural = 'Переходы по ссылкам'
+        ordering = ('-clicks',)
+
+    def __str__(self):
+        return f'{self.link}: {self.clicks}'
+
+    @classmethod
+    def add(cls, stats):
+        """
+        Прибавляет переходы из `stats` (`id ссылки: (переходы, время)`).
+
+        Недостающие строки создаются через `ON CONFLICT DO NOTHING`,
+        затем счётчики увеличиваются одним `UPDATE` на пачку.
+        """
+        link_ids = list(stats)
+        with transaction.atomic():
+            for start in range(0, len(link_ids), CLICKS_FLUSH_BATCH):
+                batch = link_ids[start:start + CLICKS_FLUSH_BATCH]
+                cls.objects.bulk_create(
+                    [
+                        cls(
+                            link_id=link_id,
+                            clicks=0,
+                            last_accessed=stats[link_id][1],
+                        )
+                        for link_id in batch
+                    ],
+                    ignore_conflicts=True,
+                )
+                cls.objects.filter(link_id__in=batch).update(
+                    clicks=F('clicks') + Case(
+                        *(
+                            When(
+                                link_id=link_id,
+                                then=Value(stats[link_id][0]),
+                            )
+                            for link_id in batch
+                        ),
+                        output_field=PositiveBigIntegerField(),
+                    ),
+                    last_accessed=Greatest(
+                        'last_accessed',
+                        Case(
+                            *(
+                                When(
+                                    link_id=link_id,
+                                    then=Value(stats[link_id][1]),
+                                )
+                                for link_id in batch
+                            ),
+                            output_field=models.DateTimeField(),
+                        ),
+                    ),
+                )
@@ -0,0 +1,11 @@
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from shortener.cache import link_cache
+from shortener.models import LinkMapped
+
+
+@receiver(post_save, sender=LinkMapped)
+def forget_missing_link(sender, instance, **kwargs):
+    """Сбрасывает кэш хэша, который мог быть закэширован как неизвестный."""
+    link_cache.forget(instance.code)
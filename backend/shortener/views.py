@@ -2,7 +2,8 @@ import logging
 from django.http import JsonResponse
 from django.views.decorators.http import require_GET
 
-from shortener.models import LinkMapped
+from shortener.analytics import click_buffer
+from shortener.cache import link_cache
 
 logger = logging.getLogger(__name__)
 
@@ -11,13 +12,13 @@ logger = logging.getLogger(__name__)
 def load_url(request, url_hash: str) -> JsonResponse:
     """Перенаправление."""
     try:
-        link = LinkMapped.objects.filter(url_hash=url_hash).first()
-        if not link:
+        original_url = link_cache.resolve(url_hash)
+        if not original_url:
             return JsonResponse(
                 {"error": "Ссылка не найдена"},
                 status=404
             )
-        original_url = link.original_url
+        click_buffer.record(url_hash)
         logger.info(f"Перенаправление с {url_hash} на {original_url}")
         return JsonResponse(
             {"redirect": original_url},
@@ -48,6 +48,12 @@ class User(AbstractUser):
         blank=True,
         null=True,
     )
+    avatar_variants = models.JSONField(
+        verbose_name='варианты аватара',
+        default=dict,
+        blank=True,
+        editable=False,
+    )
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username', 'first_name', 'last_name']
@@ -100,18 +106,3 @@ class Subscriber(models.Model):
         return (
             f"{self.user.username} подписан на {self.author.username}"
         )
-
-    @classmethod
-    def get_prefetch_subscribers(cls, lookup, user):
-        return models.Prefetch(
-            lookup,
-            queryset=cls.objects.all().annotate(
-                is_subscribed=models.Exists(
-                    cls.objects.filter(
-                        author=models.OuterRef('author'),
-                        user_id=user.id,
-                    )
-                )
-            ),
-            to_attr='subs',
-        )